@@ -34,16 +34,27 @@ class AttrAccess:
         return new
     def __nodename__(self):
         return self.__class__.__name__.lower()
+    @classmethod
+    def __nodeschema__(cls):
+        # enumerate class fields once per class, exclude private and special fields
+        # as well as functions, keep their declared python types
+        schema = cls.__dict__.get('_schema_',None)
+        if schema is None:
+            fields = tuple(filter(lambda y:(y[0]!='_' and not callable(getattr(cls,y))),\
+                                  dir(cls)))
+            schema = {'fields': fields, 'fieldset': frozenset(fields),\
+                      'fieldstr': ', '.join(fields),\
+                      'types': dict((f,type(getattr(cls,f)).__name__) for f in fields)}
+            cls._schema_ = schema
+        return schema
     def __nodeattrs__(self,extra_filter = None):
         # enumerate class fields, exclude private and special fields as well as functions
-        if extra_filter is None:
-            return list(filter(lambda y:(y[0]!='_' and not callable(self[y])),dir(self)))
-        if not callable(extra_filter):
-            return list(filter(lambda y:(y[0]!='_' and not callable(self[y])),dir(self)))
-        return list(filter(lambda y: (y[0]!='_' and not callable(self[y]) and \
-                                      extra_filter(self[y])),dir(self)))
+        fields = self.__nodeschema__()['fields']
+        if extra_filter is None or not callable(extra_filter):
+            return list(fields)
+        return list(filter(lambda y:extra_filter(self[y]),fields))
     def __contains__(self,key):
-        return key in self.__nodeattrs__()
+        return key in self.__nodeschema__()['fieldset']
     def __getitem__(self,item):
         # allow usage of subscript
         return self.__getattribute__(item)
@@ -52,9 +63,9 @@ class AttrAccess:
         return self.__setattr__(item,value)
     def __nodetolist__(self):
         # return all atribute values as a list
-        return list(self[fieldname] for fieldname in self.__nodeattrs__())
+        return list(self[fieldname] for fieldname in self.__nodeschema__()['fields'])
     def __nodetodict__(self):
-        return dict(zip(self.__nodeattrs__(),self.__nodetolist__()))
+        return dict((fieldname,self[fieldname]) for fieldname in self.__nodeschema__()['fields'])
     def __nodeinband__(self,inlist,overwrite=False,debug=False):
         # allow initialization of all structures by list, tuple or dict
         if inlist is None:
@@ -112,7 +123,7 @@ class AttrAccess:
         contents = self.__strvalues__()
         return f'{name}({contents})'
     def __strfields__(self):
-        return ', '.join(self.__nodeattrs__())
+        return self.__nodeschema__()['fieldstr']
     def __strvalues__(self):
         return ', '.join(f'{key[0]}=\'{key[1]}\'' for key in self.__nodetodict__().items())
     def __htmlid__(self,elem='div'):
@@ -152,36 +163,86 @@ class Sqlite3Access(AttrAccess):
     _sqlite3_ = None
     _cursor_ = None
     _prevquery_ = ''
+    _indexes_ = ()                 # column tuples of the secondary indexes
+    _batches_ = dict()             # the open units of work by connection, see SqliteBatch
     def __init__(self):
         self.__doc__ = 'Sqlite3 Access: Allow enumeration and operations for sqlite3'
+    def __sqlitebatch__(self,cursor):
+        # open (or join) the unit of work of the cursor connection, use it with "with"
+        return SqliteBatch(cursor)
+    def __sqlitepending__(self,cursor):
+        # return the open unit of work of the cursor connection, None when writing directly
+        if cursor is None or len(Sqlite3Access._batches_) == 0:
+            return None
+        return Sqlite3Access._batches_.get(cursor.connection,None)
+    def __sqliteflush__(self,cursor):
+        # write the rows and links pending in the unit of work, only the last write of
+        # every id is kept, each statement runs once with executemany, no commit here
+        batch = self.__sqlitepending__(cursor)
+        if batch is None or batch['size'] == 0:
+            return cursor
+        rows = batch['rows']
+        links = batch['links']
+        batch['rows'] = dict()
+        batch['links'] = dict()
+        batch['size'] = 0
+        for table,(replace_query,pending) in rows.items():
+            deleted = list((id,) for id,values in pending.items() if values is None)
+            replaced = list(values for values in pending.values() if values is not None)
+            if len(deleted) > 0:
+                cursor = cursor.executemany(f'DELETE FROM {table} WHERE id = ?',deleted)
+            if len(replaced) > 0:
+                cursor = cursor.executemany(replace_query,replaced)
+        for table,pending in links.items():
+            cursor = cursor.executemany(f'DELETE FROM {table} WHERE id = ?',\
+                                        list((id,) for id in pending))
+            cursor = cursor.executemany(f'INSERT OR IGNORE INTO {table}(id, parentid) VALUES (?, ?)',\
+                                        list((id,p) for id,ids in pending.items() for p in ids))
+        return cursor
     def __sqlitefields__(self):
         # use attribute access to enumerate fields
         return self.__strfields__()
     def __sqlitetypes__(self):
-        # detect field types and constraints
-        result = ''
-        for fieldname in self.__nodeattrs__():
-            if fieldname == 'id':
-                fieldtype ='INT PRIMAY KEY NOT NULL'
-            else:
-                if fieldname.lower().find('id') > 0 or \
-                   fieldname.lower().find('count') > 0 or \
-                   fieldname.lower().find('_num') > 0 or \
-                   fieldname.lower().find('_amt') > 0 or \
-                   fieldname.lower().find('_score') > 0 or \
-                   type(self[fieldname]).__name__.title().find('Int') >= 0 :
-        # TODO: Find better detection/mapping to use here
-                    fieldtype = 'INT'
+        # detect field types and constraints, computed once per class
+        schema = self.__nodeschema__()
+        if schema.get('sqltypes',None) is None:
+            sqltypes = dict()
+            for fieldname in schema['fields']:
+                if fieldname == 'id':
+                    fieldtype ='INT PRIMAY KEY NOT NULL'
                 else:
-                    fieldtype = 'VARCHAR'
-            if result == '':
-                result = f'{fieldname} {fieldtype}'
-            else:
-                result = f'{result},{fieldname} {fieldtype}'
-        return result
+                    if fieldname.lower().find('id') > 0 or \
+                       fieldname.lower().find('count') > 0 or \
+                       fieldname.lower().find('_num') > 0 or \
+                       fieldname.lower().find('_amt') > 0 or \
+                       fieldname.lower().find('_score') > 0 or \
+                       schema['types'][fieldname].title().find('Int') >= 0 :
+            # TODO: Find better detection/mapping to use here
+                        fieldtype = 'INT'
+                    else:
+                        fieldtype = 'VARCHAR'
+                sqltypes[fieldname] = fieldtype
+            schema['sqltypes'] = sqltypes
+            schema['sqltypestr'] = ','.join(f'{f} {t}' for f,t in sqltypes.items())
+        return schema['sqltypestr']
     def __sqlitetable__(self):
         # return the table name of current class
         return self.__nodename__().lower()
+    def __sqliteindexes__(self):
+        # return the create statements of the secondary indexes by index name
+        table = self.__sqlitetable__()
+        return dict((f'{table}_by_{"_".join(cols)}',\
+                     f'CREATE INDEX IF NOT EXISTS {table}_by_{"_".join(cols)} ON {table} ({", ".join(cols)})')\
+                    for cols in self._indexes_)
+    def __sqliteplan__(self,cursor,extra_where='',params=(),order_by='id ASC'):
+        # return the query plan details of the select __sqliteall__ would run
+        query = self.__sqlitequery__(what_clause='',where_clause=extra_where,order_by=order_by)
+        try:
+            rows = cursor.execute(f'EXPLAIN QUERY PLAN {query}',params).fetchall()
+        except Exception as e:
+            print(f'ERROR: Query plan failed with {e.__class__.__name__} saying {e.args}')
+            return []
+        return list(r[-1] for r in rows)
     def __sqlitequery__(self,operation='SELECT',what_clause='*', \
             from_clause ='', where_clause='', order_by='', values='',debug=False):
         # construct a query string
@@ -252,6 +313,7 @@ class Sqlite3Access(AttrAccess):
             return result
     def __sqlitenextid__(self,cursor,extra_where='',silent=False):
         # get the next available id to create a new object
+        self.__sqliteflush__(cursor)
         self._prevquery_ = self.__sqlitequery__(what_clause='max(id)')
         if cursor is not None:
             # we don't care if the query has already executed
@@ -268,6 +330,7 @@ class Sqlite3Access(AttrAccess):
         return None # This ensures an error
     def __sqlitenext__(self,cursor,extra_where='',debug=False):
         # mutate self and set current id by select firstrow()
+        self.__sqliteflush__(cursor)
         query = self.__sqlitequery__(what_clause='',where_clause=extra_where,order_by='id ASC')
         if self.__sqlitevalidcur__(cursor,query):
             if self._prevquery_.find(query) <0:
@@ -286,7 +349,7 @@ class Sqlite3Access(AttrAccess):
                 if len(first_row) == 0:
                     return None
                 #use fetchmany because default=1row
-                for fieldname in self.__sqlitefields__().split(', '):
+                for fieldname in self.__nodeattrs__():
                     column = keys.get(fieldname,None)
                     if column is None:
                         print(f'ERROR: query({query}) did not contain key {fieldname}')
@@ -296,23 +359,83 @@ class Sqlite3Access(AttrAccess):
             if at_least_one:
                 return cursor
         return None # invalid cursor or no more results
+    def __sqliteall__(self,cursor,extra_where='',params=(),order_by='id ASC',debug=False):
+        # fetch all records matching extra_where with one query, return them as new nodes
+        query = self.__sqlitequery__(what_clause='',where_clause=extra_where,order_by=order_by)
+        result = []
+        if cursor is None:
+            print('ERROR: attempted bulk fetch with no cursor')
+            return result
+        self.__sqliteflush__(cursor)
+        self._prevquery_ = query
+        try:
+            if debug: print(f'DEBUG: Executing {query} with {params}')
+            cursor = cursor.execute(query,params)
+        except Exception as e:
+            print(f'''ERROR: Bulk fetch threw {e.__class__.__name__} saying
+            {e.args}
+            ''')
+            return result
+        fields = list(f[0] for f in cursor.description)
+        for row in cursor.fetchall():
+            anew = self.__class__()
+            for column,fieldname in enumerate(fields):
+                anew[fieldname] = row[column]
+            result.append(anew)
+        return result
+    def __sqliteiter__(self,cursor,extra_where='',params=(),order_by='id ASC',limit=None):
+        # yield the records matching extra_where as new nodes while they are read,
+        # on a cursor of its own so other queries can run in between
+        query = self.__sqlitequery__(what_clause='',where_clause=extra_where,order_by=order_by)
+        if limit is not None:
+            query = f'{query} LIMIT {int(limit)}'
+        if cursor is None:
+            print('ERROR: attempted lazy fetch with no cursor')
+            return
+        self.__sqliteflush__(cursor)
+        try:
+            rows = cursor.connection.cursor().execute(query,params)
+        except Exception as e:
+            print(f'''ERROR: Lazy fetch threw {e.__class__.__name__} saying
+            {e.args}
+            ''')
+            return
+        fields = list(f[0] for f in rows.description)
+        for row in rows:
+            anew = self.__class__()
+            for column,fieldname in enumerate(fields):
+                anew[fieldname] = row[column]
+            yield anew
     def __sqliteself__(self,cursor,extra_where=''):
         # mutate self and return select result on self.id and extra_where
         where_cl = f'id = {self.id}'
         if extra_where != '':
             where_cl = f'{where_cl} AND {extra_where}'
         return self.__sqlitenext__(cursor,where_cl)
+    def __sqlitereplace__(self,operation='REPLACE INTO'):
+        # return the query writing a whole record by id
+        qw = f'{self.__sqlitetable__()}({self.__sqlitefields__()})'
+        qv = ', '.join('?'*len(self.__nodeschema__()['fields']))
+        # qe = f' id = {self.id}' # not necessary for replace
+        return self.__sqlitequery__(operation = operation,\
+                                    what_clause = qw, values = qv)
     def __sqliteupdate__(self,cursor,extra_where=''):
         # update database from self
         if self.id == None:
             self.id = self.__sqlitenextid__(cursor,extra_where)
-        qw = f'{self.__sqlitetable__()}({self.__sqlitefields__()})'
-        qv = ', '.join('?'*len(self.__nodeattrs__()))
-        # qe = f' id = {self.id}' # not necessary for replace
-        query = self.__sqlitequery__(operation = 'REPLACE INTO',\
-                                     what_clause = qw, values = qv)
+        query = self.__sqlitereplace__()
         if cursor is not None:
             self._prevquery_ = query
+            batch = self.__sqlitepending__(cursor)
+            if batch is not None:
+                if batch['insert']:
+                    # new records only, an id already stored fails the batch
+                    query = self.__sqlitereplace__('INSERT INTO')
+                # the unit of work keeps the last values of every id
+                batch['rows'].setdefault(self.__sqlitetable__(),(query,dict()))[1][int(self.id)] = \
+                    self.__nodetolist__()
+                batch['size'] += 1
+                return cursor
             try:
                 cursor = cursor.execute(query,self.__nodetolist__())
                 cursor.connection.commit()
@@ -331,6 +454,13 @@ class Sqlite3Access(AttrAccess):
                 query = f'{query}, {extra_where}'
             if cursor is not None:
                 self._prevquery_ = query
+                batch = self.__sqlitepending__(cursor)
+                if batch is not None and extra_where == '':
+                    batch['rows'].setdefault(self.__sqlitetable__(),\
+                        (self.__sqlitereplace__(),dict()))[1][int(self.id)] = None
+                    batch['size'] += 1
+                    return cursor
+                self.__sqliteflush__(cursor)
                 try:
                     cursor = cursor.execute(query)
                     cursor.connection.commit()
@@ -398,6 +528,76 @@ class Sqlite3Access(AttrAccess):
                         query = 'SELECT \"INVALID QUERY\"'
         return query
 
+class SqliteBatch:
+    # unit of work on one connection: while open, the writes of Sqlite3Access nodes
+    # are kept pending (reads flush them first) and the outermost batch writes them
+    # in one transaction, an exception inside rolls all of it back
+    # immediate takes the write lock when the outermost batch opens, so what is read
+    # inside (free ids) holds until the commit, and stores the records with plain
+    # INSERT: an id already used fails the batch instead of overwriting the record
+    # a nested batch opens a savepoint, an exception inside undoes its writes only
+    # and the outer batch goes on, failed is set when the batch was rolled back
+    def __init__(self,cursor,immediate=False):
+        self.cursor = cursor
+        self.immediate = immediate
+        self.failed = False
+    def __enter__(self):
+        con = self.cursor.connection
+        batch = Sqlite3Access._batches_.get(con,None)
+        if batch is None:
+            if self.immediate:
+                con.execute('BEGIN IMMEDIATE')
+            batch = {'depth': 0, 'size': 0, 'rows': dict(), 'links': dict(),\
+                     'insert': self.immediate}
+            Sqlite3Access._batches_[con] = batch
+        else:
+            # the outer writes go to the database first, the savepoint keeps them
+            Sqlite3Access().__sqliteflush__(self.cursor)
+            con.execute(f'SAVEPOINT batch_{batch["depth"]}')
+        batch['depth'] += 1
+        return self.cursor
+    def __exit__(self,exc_type,exc_value,traceback):
+        con = self.cursor.connection
+        batch = Sqlite3Access._batches_.get(con,None)
+        if batch is None:
+            return False # already dropped
+        batch['depth'] -= 1
+        if batch['depth'] > 0:
+            # nested: the pending writes stay for the outer batch, or are undone
+            savepoint = f'batch_{batch["depth"]}'
+            try:
+                if exc_type is not None:
+                    print(f'ERROR: Nested batch dropped after {exc_type.__name__}, rolling it back')
+                    self.failed = True
+                    con.execute(f'ROLLBACK TO {savepoint}')
+                con.execute(f'RELEASE {savepoint}')
+            except Exception as e:
+                print(f'''ERROR: Nested batch savepoint failed saying
+                Exception type {e.__class__.__name__} - {e.args}''')
+            finally:
+                if exc_type is not None:
+                    # all pending writes are from this batch, the outer ones were flushed
+                    batch['rows'] = dict()
+                    batch['links'] = dict()
+                    batch['size'] = 0
+            return False
+        try:
+            if exc_type is None:
+                Sqlite3Access().__sqliteflush__(self.cursor)
+                con.commit()
+            else:
+                print(f'ERROR: Batch dropped after {exc_type.__name__}, rolling back')
+                con.rollback()
+                self.failed = True
+        except Exception as e:
+            print(f'''ERROR: Batch write failed saying
+            Exception type {e.__class__.__name__} - {e.args}''')
+            con.rollback()
+            self.failed = True
+        finally:
+            del Sqlite3Access._batches_[con]
+        return False
+
 class OneToMany(Sqlite3Access):
     parentid = None
     parentclass = None
@@ -414,6 +614,18 @@ class OneToMany(Sqlite3Access):
         if len(presumed_parents)>0 and with_parentclass:
             self._parentclass_ = presumed_parents[0].__class__.__name__
         return many
+    def __otmattachall__(self,many,nodes):
+        # attach a batch of nodes in one pass, nodes with same class and id are replaced
+        index = dict(((x.__class__,x.id),i) for i,x in enumerate(many))
+        for node in nodes:
+            key = (node.__class__,node.id)
+            if key in index:
+                many[index[key]] = node
+            else:
+                index[key] = len(many)
+                many.append(node)
+            node._many_ = many
+        return many
     def __otmpeers__(self,many=None,parentid=None,\
                                            parentclass=None):
         # list all nodes sharing parentid and parentclass
@@ -447,22 +659,80 @@ class ManyToMany(Sqlite3Access):
     parentlist = ''
     parentclass = ''
     _many_ = []
+    _parentids_ = None
+    _revision_ = 0              # Bumped on every parent change, drops the LinkList indexes
     def __init__(self):
         self.__doc__ = 'ManyToMany: Manage self like a list with several parent references'
+    def __setattr__(self,name,value):
+        # parentlist is also assigned directly (edit forms, import, node in band),
+        # any assignment drops the LinkList indexes
+        if name == 'parentlist':
+            ManyToMany._revision_ += 1
+        object.__setattr__(self,name,value)
     def __mtmattach__(self,many):
         # attach self to a list of objects, saves the list internally
+        ManyToMany._revision_ += 1
         many.append(self)
         self._many_=many
         return many
+    def __mtmattachall__(self,many,nodes):
+        # attach a batch of objects in one pass, objects with same id are replaced
+        ManyToMany._revision_ += 1
+        index = dict((x.id,i) for i,x in enumerate(many))
+        for node in nodes:
+            if node.id in index:
+                many[index[node.id]] = node
+            else:
+                index[node.id] = len(many)
+                many.append(node)
+            node._many_ = many
+        return many
+    def __mtmparentids__(self):
+        # list the parent ids of self as integers, parentlist is parsed once per value
+        cached = self._parentids_
+        if cached is not None and cached[0] == self.parentlist:
+            return cached[1]
+        ids = []
+        for p in (self.parentlist or '').split(','):
+            p = p.strip()
+            if p.isnumeric() and int(p) not in ids:
+                ids.append(int(p))
+        self._parentids_ = (self.parentlist, ids)
+        return ids
+    def __mtmsetparents__(self,ids):
+        # replace the parents of self, parentlist is kept as the text form of ids
+        ManyToMany._revision_ += 1
+        ids = list(ids)
+        self.parentlist = ','.join(str(i) for i in ids)
+        self._parentids_ = (self.parentlist, ids)
+        return self.parentlist
     def __mtmparents__(self,many=None,parentclass=None):
         # list all parents of self
         if many is None:
             many = self._many_
         if parentclass is None:
             parentclass = self.parentclass
-        return list(filter(lambda x:(str(x.id) in self.parentlist.split(', ')\
+        ids = set(self.__mtmparentids__())
+        return list(filter(lambda x:(x.id in ids\
          and x.__class__.__name__ == parentclass if parentclass is not None\
          else True),many))
+    def __mtmindex__(self,many=None):
+        # index the list by parent id, every parent maps to its children in list order
+        # a LinkList keeps its index between calls
+        if many is None:
+            many = self._many_
+        if isinstance(many,LinkList):
+            return many.__linkindex__()
+        index = dict()
+        for node in many:
+            for pid in node.__mtmparentids__():
+                index.setdefault(pid,[]).append(node)
+        return index
+    def __mtmchildren__(self,parentid,many=None,index=None):
+        # list the children of one parent, pass index to reuse it between calls
+        if index is None:
+            index = self.__mtmindex__(many)
+        return index.get(int(parentid),[])
     def __mtmanypeers__(self,parentlist=None,parentclass=None):
         # list all peers of self by parentid
         if parentlist is None:
@@ -473,20 +743,141 @@ class ManyToMany(Sqlite3Access):
          for y in x.parentlist.split(', ')) and x.__class__.__name__ ==\
          parentclass if parentclass is not None else True),many))
     def __mtmaddparent__(self,id):
-        # TODO: This doesn't work properly
-        if id is None:
+        # add a parent id to self, parentlist is unchanged if already present
+        if id is None or not str(id).strip().isnumeric():
             return self.parentlist
-        if self.parentlist is None or self.parentlist == '':
-            self.parentlist=str(id)
-        else:
-            self.parentlist = f'{self.parentlist}, {str(id)}'
-        return self.parentlist
+        ids = self.__mtmparentids__()
+        if int(id) in ids:
+            return self.parentlist
+        return self.__mtmsetparents__(ids+[int(id)])
     def __mtmdelparent__(self,id):
-        # TODO: This doesn't work properly
-        if self.parentlist == id: return '' # cheaty optimization
-        self.parentlist=', '.join(list(filter(lambda x:x.strip().startswith(str(id))\
-         and x.strip().endswith(str(id)),self.parentlist.split(','))))
-        return self.parentlist
+        # remove a parent id from self
+        if id is None or not str(id).strip().isnumeric():
+            return self.parentlist
+        ids = self.__mtmparentids__()
+        if int(id) not in ids:
+            return self.parentlist
+        return self.__mtmsetparents__(filter(lambda x:x != int(id),ids))
+    def __mtmlinktable__(self):
+        # the table holding one row per (id, parentid) link of this class
+        return f'{self.__sqlitetable__()}_link'
+    def __mtmlinkcreate__(self):
+        # return the create script of the link table, indexed in both directions
+        table = self.__mtmlinktable__()
+        return f'''
+    CREATE TABLE IF NOT EXISTS {table}(id INTEGER NOT NULL, parentid INTEGER NOT NULL,
+     PRIMARY KEY (id, parentid)) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS {table}_by_parent ON {table} (parentid, id);'''
+    def __mtmlinksave__(self,cursor,commit=True):
+        # write the links of self from parentlist into the link table
+        if cursor is None or self.id is None:
+            return cursor
+        table = self.__mtmlinktable__()
+        batch = self.__sqlitepending__(cursor)
+        if batch is not None:
+            batch['links'].setdefault(table,dict())[int(self.id)] = list(self.__mtmparentids__())
+            batch['size'] += 1
+            return cursor
+        try:
+            cursor = cursor.execute(f'DELETE FROM {table} WHERE id = ?',(self.id,))
+            cursor = cursor.executemany(f'INSERT OR IGNORE INTO {table}(id, parentid) VALUES (?, ?)',\
+                                        list((self.id,p) for p in self.__mtmparentids__()))
+            if commit:
+                cursor.connection.commit()
+        except Exception as e:
+            print(f'''ERROR: Link update failed on {table} for id {self.id} saying
+            Exception type {e.__class__.__name__} - {e.args}''')
+        return cursor
+    def __mtmlinkchildren__(self,cursor,parentid):
+        # ids linked to one parent, answered by the parentid index
+        self.__sqliteflush__(cursor)
+        try:
+            rows = cursor.execute(f'SELECT id FROM {self.__mtmlinktable__()} WHERE parentid = ? ORDER BY id',\
+                                  (int(parentid),)).fetchall()
+        except Exception as e:
+            print(f'ERROR: Link lookup failed with {e.__class__.__name__} saying {e.args}')
+            return []
+        return list(r[0] for r in rows)
+    def __mtmlinkplan__(self,cursor):
+        # return the query plan details of the lookup by parent
+        try:
+            rows = cursor.execute(f'EXPLAIN QUERY PLAN SELECT id FROM {self.__mtmlinktable__()} WHERE parentid = ? ORDER BY id',\
+                                  (0,)).fetchall()
+        except Exception as e:
+            print(f'ERROR: Query plan failed with {e.__class__.__name__} saying {e.args}')
+            return []
+        return list(r[-1] for r in rows)
+    def __mtmlinkparents__(self,cursor,id=None):
+        # parent ids linked to id (default self), answered by the primary key
+        if id is None:
+            id = self.id
+        self.__sqliteflush__(cursor)
+        try:
+            rows = cursor.execute(f'SELECT parentid FROM {self.__mtmlinktable__()} WHERE id = ? ORDER BY parentid',\
+                                  (int(id),)).fetchall()
+        except Exception as e:
+            print(f'ERROR: Link lookup failed with {e.__class__.__name__} saying {e.args}')
+            return []
+        return list(r[0] for r in rows)
+    def __mtmlinkload__(self,cursor,nodes):
+        # set the parents of nodes from the link table with a single query
+        # the link table wins when it disagrees with the stored parentlist, nodes
+        # without any link (written by something unaware of links) get them rebuilt
+        self.__sqliteflush__(cursor)
+        try:
+            rows = cursor.execute(f'SELECT id, parentid FROM {self.__mtmlinktable__()} ORDER BY id, parentid').fetchall()
+        except Exception as e:
+            print(f'NOTICE: No parent links available ({e.__class__.__name__}), using parentlist')
+            return nodes
+        links = dict()
+        for id,parentid in rows:
+            links.setdefault(id,[]).append(parentid)
+        mismatched = []
+        unlinked = []
+        for node in nodes:
+            ids = links.get(node.id,None)
+            if ids is None:
+                if len(node.__mtmparentids__()) > 0:
+                    unlinked.append(node)
+            elif set(ids) != set(node.__mtmparentids__()):
+                mismatched.append(node.id)
+                node.__mtmsetparents__(ids)
+        if len(mismatched) > 0:
+            print(f'WARNING: Parentlist out of date with links for {mismatched}')
+        if len(unlinked) > 0:
+            print(f'NOTICE: Rebuilding links for {len(unlinked)} records')
+            with self.__sqlitebatch__(cursor):
+                for node in unlinked:
+                    node.__mtmlinksave__(cursor)
+        return nodes
+    def __mtmlinkrepair__(self,cursor):
+        # write the links of the records stored without any (by something unaware of
+        # links) and return how many were rebuilt, the database answers which ones
+        table = self.__mtmlinktable__()
+        nodes = self.__sqliteall__(cursor,extra_where=f'''parentlist IS NOT NULL AND NOT EXISTS
+            (SELECT 1 FROM {table} WHERE {table}.id = {self.__sqlitetable__()}.id)''')
+        nodes = list(filter(lambda x:len(x.__mtmparentids__()) > 0,nodes))
+        if len(nodes) > 0:
+            print(f'NOTICE: Rebuilding links for {len(nodes)} records')
+            with self.__sqlitebatch__(cursor):
+                for node in nodes:
+                    node.__mtmlinksave__(cursor)
+        return len(nodes)
+    def __sqliteupdate__(self,cursor,extra_where=''):
+        # update database from self, the links follow parentlist
+        cursor = Sqlite3Access.__sqliteupdate__(self,cursor,extra_where)
+        return self.__mtmlinksave__(cursor)
+    def __sqlitedelself__(self,cursor,extra_where=''):
+        # remove from database self record and its links
+        batch = self.__sqlitepending__(cursor)
+        if self.id is not None and batch is not None and extra_where == '':
+            batch['links'].setdefault(self.__mtmlinktable__(),dict())[int(self.id)] = []
+        elif self.id is not None and cursor is not None:
+            try:
+                cursor.execute(f'DELETE FROM {self.__mtmlinktable__()} WHERE id = ?',(self.id,))
+            except Exception as e:
+                print(f'ERROR: Link delete failed with {e.__class__.__name__} saying {e.args}')
+        return Sqlite3Access.__sqlitedelself__(self,cursor,extra_where)
     def __htmltable__(self,many=None,css_style='',field_filter=None,apply_to_cell=None):
         # render a table of the data
         if many is None:
@@ -512,6 +903,28 @@ class ManyToMany(Sqlite3Access):
          <tbody>{data}</tbody>
         </table>'''
 
+class LinkList(list):
+    # list of many to many nodes which indexes them by parent id
+    # the index is built on first lookup and rebuilt after the list or any parents change
+    _parents_ = None
+    _indexedat_ = None
+    def __linkindex__(self):
+        # build the parent id -> nodes index once per list revision
+        key = (len(self),ManyToMany._revision_)
+        if self._parents_ is None or self._indexedat_ != key:
+            index = dict()
+            for node in self:
+                for pid in node.__mtmparentids__():
+                    index.setdefault(pid,[]).append(node)
+            self._parents_ = index
+            self._indexedat_ = key
+        return self._parents_
+
+class LeafList(list):
+    # a list of leafs in tree pre-order, remembers the leafs, ids and parent ids it
+    # was sorted with (see __treesortedkey__)
+    _sortedkey_ = None
+
 class TreeLeaf(OneToMany):
     _path_ = []
     def __init__(self):
@@ -535,42 +948,68 @@ class TreeLeaf(OneToMany):
                 # TODO: Look at sheetid as well, if possible
                 return tree == self._many_
         return False;
+    def __treeindex__(self,tree):
+        # build in one pass the id -> leaf index, the parent id -> children lists
+        # and the list of roots
+        index = dict()
+        children = dict()
+        roots = []
+        for leaf in tree:
+            key = str(leaf.id)
+            if key in index:
+                if index[key] is not leaf:
+                    print(f'WARNING: Multiple nodes with id {leaf.id} found, keeping the first')
+                continue
+            index[key] = leaf
+            if leaf.parentid is None or leaf.parentid == '':
+                roots.append(leaf)
+            else:
+                children.setdefault(str(leaf.parentid),[]).append(leaf)
+        return index,children,roots
     def __treetraverse__(self,tree,debug=False):
-        # update the tree and leaf paths
-        if not self.__leafintree__(tree):
+        # update the tree and leaf paths in linear time, record the pre-order
+        # (siblings ordered by id) into self._order_
+        # leafs that cannot be reached from a root are reported as orphans
+        # (their parent is missing) or as part of a cycle
+        if not any(leaf is self for leaf in tree):
             tree = self.__otmattach__(tree)
-        self.__leafinvalidate__()
-        leaf_count = len(tree)
-        waiting = sorted(tree,key=lambda x:x.id,reverse=True)
-        done = []
-        treshold = leaf_count * leaf_count
-        while len(waiting)>0 and treshold >0:
-            if debug:
-                print(f'DEBUG: entering loop with {",".join(list(str(x.id) for x in waiting))} / {",".join(list(str(x.id) for x in done))}')
-            treshold-=1
+        index,children,roots = self.__treeindex__(tree)
+        for leaf in tree:
+            leaf.__leafinvalidate__()
+        waiting = sorted(roots,key=self.__treeidkey__,reverse=True)
+        for root in waiting:
+            root._path_ = [root.id]
+        order = []
+        while len(waiting) > 0:
             leaf = waiting.pop()
+            order.append(leaf)
             if debug:
-                print(f'DEBUG: searching parent {leaf.parentid} for {leaf.id}')
-            if leaf.parentid is None or leaf.parentid == '':
-                leaf._path_ = [leaf.id]
-                done.append(leaf)
-                continue
-            parents = list(filter(lambda x:x.id == leaf.parentid,done))
-            # DONE: By inserting unique ids we ensure we never choke on duplicates
-            if len(parents) > 1:
-                print('WARNING: Multiple nodes with same id and class found')
-            for p in parents:
-                leaf._path_= p._path_.copy()
-                leaf._path_.append(leaf.id)
-                done.append(leaf)
-            if leaf not in done:
-                waiting.insert(0,leaf) # push the leaf back into waiting
-        if len(waiting) > 0:
-            print('WARNING: Some nodes have been misplaced')
-            self._many_ = waiting.copy()
-        else:
-            tree = done.copy()
-            self._many_ = tree
+                print(f'DEBUG: placed {leaf.id} on path {leaf._path_}')
+            for child in sorted(children.get(str(leaf.id),[]),key=self.__treeidkey__,\
+                                reverse=True):
+                child._path_ = leaf._path_.copy()
+                child._path_.append(child.id)
+                waiting.append(child)
+        self._order_ = order
+        self._orphans_ = []
+        self._cycles_ = []
+        if len(order) < len(index):
+            # stage 2: split the leftovers in orphan branches and cycles
+            waiting = list(filter(lambda x:not x.__leafisvalid__() and \
+                                  str(x.parentid) not in index,index.values()))
+            reached = set()
+            while len(waiting) > 0:
+                leaf = waiting.pop()
+                reached.add(str(leaf.id))
+                self._orphans_.append(leaf.id)
+                waiting.extend(children.get(str(leaf.id),[]))
+            self._cycles_ = list(l.id for l in index.values() if not l.__leafisvalid__()\
+                                 and str(l.id) not in reached)
+            if len(self._orphans_) > 0:
+                print(f'WARNING: Nodes without a parent in the tree: {self._orphans_}')
+            if len(self._cycles_) > 0:
+                print(f'WARNING: Nodes caught in a parent cycle: {self._cycles_}')
+        self._many_ = tree
         return tree
     def __treecmppath__(self,tree=None,leaf=None):
         # return -2,-1,0,1 for leaf before,on, at or after self path
@@ -593,45 +1032,40 @@ class TreeLeaf(OneToMany):
                 return 1
         # leaf is one of my (grand)childs
         return 0
+    def __treeidkey__(self,leaf=None):
+        # sort key for sibling ids, numeric ids compare as numbers of any width
+        if leaf is None:
+            leaf = self
+        if str(leaf.id).isnumeric():
+            return (0,int(leaf.id),'')
+        return (1,0,str(leaf.id))
     def __treesortkey__(self,tree=None,debug=False):
-        # provide a list of previous node count
+        # provide a list with the pre-order position of every leaf in tree
         if tree is None:
             tree = self._many_
-        if not self.__leafisvalid__():
-            self.__treetraverse__(tree)
-        sort_list = [0*i for i in range(len(tree))]
-        max_p = 1 # By default we have a root-only tree
-        max_v = 0
-        for l in tree:
-            max_p = max(max_p,len(l._path_))
-            if str(l.id).isnumeric():
-                max_v = max(max_v,int(l.id))
-            else:
-                print(f'WARNING: Attempted to process non-numeric id: {l.id}')
-        if debug:
-            print(f'DEBUG: Detected max id: {max_v} and max path: {max_p}')
-        scale_factor = 10
-        while(max_v>10):
-            scale_factor*=10
-            max_v/=10
+        position = dict((id(l),i) for i,l in enumerate(self.__treesort__(tree)))
         if debug:
-            print(f'DEBUG: Calculated scale factor: {scale_factor}')
-        idx = 0
-        for l in tree: # second pass
-            for i in range(max_p):
-                sort_list[idx]*=scale_factor
-                if i<len(l._path_):
-                    sort_list[idx]+=int(l._path_[i])
-            if debug:
-                print(f'DEBUG: Generated sort key {sort_list[idx]}')
-            idx+=1
-        return sort_list
+            print(f'DEBUG: Generated sort keys for {len(position)} leafs')
+        return list(position.get(id(l),len(position)) for l in tree)
+    def __treesortedkey__(self,tree):
+        # what the pre-order depends on: each leaf in list order with its id and parent
+        return tuple((id(l),l.id,l.parentid) for l in tree)
     def __treesort__(self,tree=None):
-        # generate a sorted tree
+        # generate a sorted tree in pre-order, sorting is done once per tree:
+        # the result remembers its leafs and is returned as is on later calls until
+        # a leaf is added, removed, replaced or changes its id or parent
+        # leafs that could not be placed come last, ordered by id
         if tree is None:
             tree = self._many_
-        sort_list = self.__treesortkey__(tree)
-        return sorted(tree,key=lambda x:sort_list[tree.index(x)])
+        if getattr(tree,'_sortedkey_',None) == self.__treesortedkey__(tree):
+            return tree
+        tree = self.__treetraverse__(tree)
+        placed = set(id(l) for l in self._order_)
+        unplaced = dict((id(l),l) for l in tree if id(l) not in placed)
+        result = LeafList(self._order_)
+        result.extend(sorted(unplaced.values(),key=self.__treeidkey__))
+        result._sortedkey_ = self.__treesortedkey__(result)
+        return result
 
 # Application domain classes
 class FMEA_Function(TreeLeaf):
@@ -643,6 +1077,7 @@ class FMEA_Function(TreeLeaf):
     asset_description = ''      # The asset description
     asset_criticality = ''      # The asset criticality category
     # NOTE: difference between sheet is function is that sheet.parentid is None
+    _indexes_ = (('parentid','id'),) # sheets and the functions of one sheet
     def __init__(self):
         self.__doc__ = 'FMEA Function: Class that holds Sheet and Function information'
         self.parentclass = self.__class__.__name__
@@ -656,6 +1091,7 @@ class FMEA_Function(TreeLeaf):
     DROP TABLE IF EXISTS {table};
     {self.__sqlitecreate__(cursor)};
     CREATE UNIQUE INDEX only_one_id_on_{table} ON {table} (id);
+    {';'.join(self.__sqliteindexes__().values())};
     COMMIT;
             '''
             cursor = cursor.executescript(transaction)
@@ -719,6 +1155,19 @@ class FMEA_Function(TreeLeaf):
         else:
             print('WARNING: Returning the tree unchanged from db')
         return tree
+    def bulk_from_db(self,cursor,sheetid=None,tree=None):
+        # fill the tree from database with a single query (all sheets or one sheet)
+        if tree is None:
+            tree = self._many_
+        if sheetid is None:
+            nodes = self.__sqliteall__(cursor,extra_where='parentid IS NULL')
+        else:
+            nodes = self.__sqliteall__(cursor,extra_where='( id = ? OR parentid = ? )',\
+                                       params=(sheetid,sheetid))
+        if len(nodes) == 0:
+            print('WARNING: Returning the tree unchanged from db')
+            return tree
+        return self.__otmattachall__(tree,nodes)
     def init_tree(self,tree=[]):
         # transient function to initialise once the tree
         self.__otmattach__(tree)
@@ -762,12 +1211,12 @@ class FMEA_Function(TreeLeaf):
         if tree is None:
             tree = self._many_
         parentlist = []
-        for leaf in list(filter(lambda x:self.__treecmppath__(tree,x)==0,tree)):
-            leaf.__sqlitedelself__(cursor)
-            cursor.connection.commit()
-            tree.remove(leaf)
-            if type(leaf)!=type(self):
-                parentlist.append(leaf.id)
+        with self.__sqlitebatch__(cursor):
+            for leaf in list(filter(lambda x:self.__treecmppath__(tree,x)==0,tree)):
+                leaf.__sqlitedelself__(cursor)
+                tree.remove(leaf)
+                if type(leaf)!=type(self):
+                    parentlist.append(leaf.id)
         # TODO: Fix delete actions
         #if len(actions)>0 and len(parentlist)>0:
         #    actions[0].__class__().del_action(cursor,parentlist,actions)
@@ -782,6 +1231,8 @@ class FMEA_Failure_Mode(TreeLeaf):
     discipline = ''             # The discipline applied
     means_of_identification = ''# Means of identification of the failure mode
     sheetid = 0                 #
+    _indexes_ = (('sheetid','id'),('sheetid','parentid','id')) # the failure modes of one
+                                     # sheet, the children of one leaf in a sheet
     def __init__(self):
         self.__doc__ = 'FMEA Failure Mode: Class that holds Failure Causes'
     def create_in_db(self,cursor):
@@ -793,6 +1244,7 @@ class FMEA_Failure_Mode(TreeLeaf):
     DROP TABLE IF EXISTS {table};
     {self.__sqlitecreate__(cursor)};
     CREATE UNIQUE INDEX only_one_id_on_{table} ON {table} (id);
+    {';'.join(self.__sqliteindexes__().values())};
     COMMIT; '''
             cursor = cursor.executescript(transaction)
         except Exception as e:
@@ -860,6 +1312,19 @@ class FMEA_Failure_Mode(TreeLeaf):
         else:
             print('WARNING: Returning the tree unchanged from db')
         return tree
+    def bulk_from_db(self,cursor,sheetid=None,tree=None):
+        # fill the tree from database with a single query
+        # sheetid None loads every failure mode found in the table
+        if tree is None:
+            tree = self._many_
+        if sheetid is None:
+            nodes = self.__sqliteall__(cursor)
+        else:
+            nodes = self.__sqliteall__(cursor,extra_where='sheetid = ?',params=(sheetid,))
+        if len(nodes) == 0:
+            print('WARNING: Returning the tree unchanged from db')
+            return tree
+        return self.__otmattachall__(tree,nodes)
     def update_leaf(self,cursor,tree=None,with_parentclass=False):
         # update the db with the changes into the tree
         if tree is None:
@@ -882,13 +1347,13 @@ class FMEA_Failure_Mode(TreeLeaf):
         if tree is None:
             tree = self._many_
         parentlist=[]
-        for leaf in list(filter(lambda x:self.__treecmppath__(tree,x)==0,tree)):
-            leaf.__sqlitedelself__(cursor)
-            cursor.connection.commit()
-            parentlist.append(leaf.id)
-            tree.remove(leaf)
-        if len(actions)>0:
-            actions[0].__class__().del_action(cursor,parentlist,actions)
+        with self.__sqlitebatch__(cursor):
+            for leaf in list(filter(lambda x:self.__treecmppath__(tree,x)==0,tree)):
+                leaf.__sqlitedelself__(cursor)
+                parentlist.append(leaf.id)
+                tree.remove(leaf)
+            if len(actions)>0:
+                actions[0].__class__().del_action(cursor,parentlist,actions)
         return tree
 
 class FMEA_Action(ManyToMany):
@@ -911,8 +1376,10 @@ class FMEA_Action(ManyToMany):
             transaction = f'''
     BEGIN TRANSACTION;
     DROP TABLE IF EXISTS {table};
+    DROP TABLE IF EXISTS {self.__mtmlinktable__()};
     {self.__sqlitecreate__(cursor)};
     CREATE UNIQUE INDEX only_one_id_on_{table} ON {table} (id);
+    {self.__mtmlinkcreate__()}
     COMMIT; '''
             cursor = cursor.executescript(transaction)
         except Exception as e:
@@ -967,6 +1434,16 @@ class FMEA_Action(ManyToMany):
         else:
             print('WARNING: Returning actions unchanged')
         return actions
+    def bulk_from_db(self,cursor,tree,actions=None):
+        # fill the actions from database with a single query
+        if actions is None:
+            actions = self._many_
+        nodes = self.__sqliteall__(cursor,extra_where='parentlist IS NOT NULL')
+        if len(nodes) == 0:
+            print('WARNING: Returning actions unchanged')
+            return actions
+        nodes = self.__mtmlinkload__(cursor,nodes)
+        return self.__mtmattachall__(actions,nodes)
     def update_action(self,cursor,actions=None):
         # update the db with the changes into the tree
         if actions is None:
@@ -992,31 +1469,26 @@ class FMEA_Action(ManyToMany):
             self._many_ = actions
         changed = False
         if len(parentid) > 0:
-            # we clean the parentlists
-            for act in actions:
-                if debug: print(f'DEBUG: Evaluating action {str(act)}')
-                act_changed = False
-                for pid in parentid:
-                    if debug: print(f'DEBUG: Evaluating "{pid}" to remove from "{act.parentlist}"')
-                    prev_parentlist = act.parentlist
-                    new_parentlist = ",".join(list(set(map(lambda z:str(z), filter( \
-                     lambda x: x not in parentid and str(x) not in parentid, list(\
-                     map(lambda y: int(y.strip()) if y.strip().isnumeric() else -1,\
-                     prev_parentlist.split(","))))))))
-                    #new_parentlist = act.__mtmdelparent__(pid)
-                    if debug: print(f'DEBUG: New parentlist {new_parentlist}')
-                    if new_parentlist == '' or new_parentlist is None:
+            # we clean the parent links, actions left without parents are removed
+            drop = set(int(p) for p in parentid if str(p).strip().isnumeric())
+            removed = []
+            with self.__sqlitebatch__(cursor):
+                for act in actions:
+                    prev_ids = act.__mtmparentids__()
+                    new_ids = list(filter(lambda x:x not in drop,prev_ids))
+                    if len(new_ids) == len(prev_ids):
+                        continue # not attached to the removed parents
+                    if debug: print(f'DEBUG: Action {act.id} parents {prev_ids} become {new_ids}')
+                    if len(new_ids) == 0:
                         if debug: print('DEBUG: Reached delete from db')
                         act.__sqlitedelself__(cursor)
-                        actions.remove(act)
-                        act_changed = False # we no longer need it
-                        break
-                    if new_parentlist != prev_parentlist:
-                        if debug: print('DEBUG: We note an update')
-                        act.parentlist = new_parentlist
-                        act_changed = True
-                if act_changed:
-                    act.__sqliteupdate__(cursor)
+                        removed.append(act)
+                    else:
+                        act.__mtmsetparents__(new_ids)
+                        act.__sqliteupdate__(cursor)
+            if len(removed) > 0:
+                removed = set(id(act) for act in removed)
+                actions[:] = list(filter(lambda x:id(x) not in removed,actions))
         else:
             # we just remove the action
             self.__sqlitedelself__(cursor)
@@ -1032,6 +1504,32 @@ class FMEA_Action(ManyToMany):
         if new_parentlist != prev_parentlist:
             self.__sqliteupdate__(cursor)
 
+class DomainList(list):
+    # list of domain rules which indexes them by (table_name, field_name)
+    # the index is built on first lookup, the list is not changed afterwards
+    _fields_ = None
+    def __domainindex__(self):
+        # build the index once, each field keeps its rules, options and colors
+        if self._fields_ is None:
+            fields = dict()
+            for rule in self:
+                field = fields.setdefault((rule.table_name,rule.field_name),\
+                                          {'rules': [], 'options': [], 'colors': dict()})
+                field['rules'].append(rule)
+                field['options'].append((rule.field_option,rule.field_option_color))
+                field['colors'][rule.field_option] = rule.field_option_color
+            self._fields_ = fields
+        return self._fields_
+    def __domainfield__(self,table_name,field_name):
+        # return the rules, options and colors of one field
+        return self.__domainindex__().get((table_name,field_name),\
+                                          {'rules': [], 'options': [], 'colors': dict()})
+    def __domaincopy__(self):
+        # copy the list and share the index
+        new = DomainList(self)
+        new._fields_ = self.__domainindex__()
+        return new
+
 class FMEA_Domain(OneToMany):
     title = ''                  # The short rule description
     table_name = ''             # The table the rule applies to
@@ -1041,10 +1539,12 @@ class FMEA_Domain(OneToMany):
     field_option_color = ''     # The CSS color this option adds
     field_hint = ''             # The hint for tooltips or edit placeholder
     field_o_num = 0             # The display order of the field
+    _revision_ = 0              # Bumped on every write, drops the domain caches
     def __init__(self):
         self.__doc__ = 'FMEA Domain: Class that holds all business rules'
     def create_in_db(self,cursor,defaults=True):
         # create the table and the initial records
+        FMEA_Domain._revision_ += 1
         try:
             if defaults:
                 transaction = f'''BEGIN TRANSACTION;
@@ -1192,10 +1692,17 @@ class FMEA_Domain(OneToMany):
                         anew.__otmattach__(domain)
                 prev_id = anew.id
         return sorted(domain,key=lambda x:x.field_o_num)
+    def bulk_from_db(self,cursor,domain=None):
+        # fill the domain from database with a single query, ordered like get_from_db
+        if domain is None:
+            domain = self._many_
+        nodes = self.__sqliteall__(cursor)
+        return sorted(self.__otmattachall__(domain,nodes),key=lambda x:x.field_o_num)
     def update_leaf(self,cursor,domain=None):
         # update the db with the changes into the tree
         if domain is None:
             domain = self._many_
+        FMEA_Domain._revision_ += 1
         res = self.__sqliteupdate__(cursor)
         if res is not None:
             found = False
@@ -1211,22 +1718,28 @@ class FMEA_Domain(OneToMany):
         # remove from db a rule
         if domain is None:
             domain = self._many_
+        FMEA_Domain._revision_ += 1
         res = self.__sqlitedelself__(cursor)
         if res is not None:
             domain = list(filter(lambda x:x.id != self.id,domain))
         return domain
     def get_options(self,leaf,fieldname,domain=None):
-        # get the list of options for a field
+        # get the list of (option, color) for a field
         if domain is None:
             domain = self._many_
-        return list(filter(lambda x: x.fieldname == fieldame and\
-                                     x.tablename == leaf.__sqlitetable__(),domain))
+        if not isinstance(domain,DomainList):
+            domain = DomainList(domain)
+        return domain.__domainfield__(leaf.__sqlitetable__(),fieldname)['options']
 
 
 class FMEA_App(AttrAccess):
     use_debug            = True # change this when going to prod
     use_import_to_global = True # WARNING: Danger of refactoring
-    dependencies = [('flask','Flask','Flask'),('flask','render_template','rend'),('flask','render_template_string','rends'),('flask','redirect','redir'),('flask','url_for','url_for'),('flask','request','request'),('flask','send_file','send_file'),('markupsafe','Markup','Markup'),('os','path','path'),('os','makedirs','mkdir'),('os','remove','rmfile'),('sqlite3','',''),('pandas','','pd'),('openpyxl','','')]
+    revision_table       = 'fmea_revision' # one revision row per sheet, kept by triggers
+    revision_domain      = -1 # revision row of the domain, shared by all sheets
+    revision_actions     = -2 # revision row of all actions, read by the aadc report
+    report_numeric       = ('Sheet id','Risk','Risk level','Failure risk') # xlsx number columns
+    dependencies = [('flask','Flask','Flask'),('flask','render_template','rend'),('flask','render_template_string','rends'),('flask','redirect','redir'),('flask','url_for','url_for'),('flask','request','request'),('flask','send_file','send_file'),('flask','stream_with_context','stream_with_context'),('markupsafe','Markup','Markup'),('os','path','path'),('os','makedirs','mkdir'),('os','remove','rmfile'),('sqlite3','',''),('threading','',''),('atexit','',''),('hashlib','sha256','sha256'),('gzip','compress','gzip_compress'),('base64','b64decode','b64decode'),('io','BytesIO','BytesIO'),('io','StringIO','StringIO'),('csv','',''),('itertools','islice','islice'),('tempfile','SpooledTemporaryFile','SpooledTemporaryFile'),('concurrent.futures','ProcessPoolExecutor','ProcessPoolExecutor'),('os','cpu_count','cpu_count'),('pandas','','pd'),('openpyxl','','')]
     #from {1} import {2} as {3}
     def __init__(self,app=None):
         self.__doc__ = 'Failure Mode and Effects Analysis: The Flask App'
@@ -1293,24 +1806,156 @@ class FMEA_App(AttrAccess):
          f'{self.__nodename__().lower()}.sqlite3')
         self.app.config['MAX_TREE_DEPTH'] = 15 # Number of Failure Modes
         self.app.config['PREVIEW_LINES']  = 5 # Number of lines in report preview
+        self.app.config['PREVIEW_LAZY_LEAFS'] = 100 # Leafs read one by one for a preview before loading the sheet
+        self.app.config['REPORT_CACHE_ENTRIES'] = 32 # Reports kept in memory until evicted
+        self.app.config['REPORT_CACHE_LINES'] = 500000 # Report lines kept over all cached reports
+        self.app.config['CONDITIONAL_ROUTES'] = True # Answer 304 while the sheet revision holds
+        self.app.config['REPORT_WORKERS'] = None # Processes building all sheet reports, None: one per core
         self.app.config['MAX_CHARS_DESCRIPTION'] = 20
         #Max number of chars in description preview
+        self.app.config['DB_POOL'] = True # Reuse connections between requests
+        self.app.config['DB_POOL_SIZE'] = 8 # Max number of idle connections kept
+        self.app.config['STREAM_PAGES'] = True # Send large pages while they render
+        self.app.config['STREAM_CHUNK_SIZE'] = 16384 # Characters sent per streamed write
+        self.app.config['STATIC_ASSETS'] = {'css': ['table','tree'], 'js': ['editor','report'],\
+         'icon': []} # asset kinds with the options their compile function accepts
+        self.app.config['STATIC_MAX_AGE'] = 31536000 # Seconds browsers keep a versioned asset
+        self.app.config['EXPORT_GZIP'] = True # Compress sheet downloads for clients accepting gzip
+        self.app.config['UPLOAD_MAX_BYTES'] = 64*1024*1024 # Largest request and sheet upload
+        self.app.config['REPORT_SPOOL_SIZE'] = 8*1024*1024 # Report bytes kept in memory before disk
+        self.app.config['DB_PRAGMAS'] = {'journal_mode': 'WAL', 'synchronous': 'NORMAL',\
+         'cache_size': -16384, 'mmap_size': 268435456, 'temp_store': 'MEMORY'}
+    def get_db_pool(self):
+        # create once the pool of reusable connections
+        pool = self.__dict__.get('_pool_',None)
+        if pool is None:
+            app = self
+            class PooledConnection(self.sqlite3.Connection):
+                # close() gives the connection back to the pool
+                def close(self):
+                    app.release_db_connection(self)
+            pool = {'factory': PooledConnection, 'idle': [], 'all': [],\
+                    'lock': self.threading.Lock(), 'local': self.threading.local()}
+            self._pool_ = pool
+            self.atexit.register(self.close_db_pool)
+        return pool
     def get_db_connection(self):
-        # connect to database
+        # connect to database, connections are taken from the pool and stay bound
+        # to the current thread until released by close() or by the app teardown
         db_file = self.app.config['db_file']
-        # TODO: find a way to cache these
-        return self.sqlite3.connect(db_file).cursor()
+        if not self.app.config.get('DB_POOL',False):
+            return self.sqlite3.connect(db_file).cursor()
+        pool = self.get_db_pool()
+        local = pool['local']
+        if getattr(local,'con',None) is not None:
+            local.refs += 1
+            return local.con.cursor()
+        con = None
+        with pool['lock']:
+            if len(pool['idle']) > 0:
+                con = pool['idle'].pop()
+        if con is None:
+            con = self.sqlite3.connect(db_file,factory=pool['factory'],\
+                                       check_same_thread=False)
+            for pragma,value in self.app.config.get('DB_PRAGMAS',{}).items():
+                try:
+                    con.execute(f'PRAGMA {pragma}={value}')
+                except Exception as e:
+                    print(f'WARNING: Could not set pragma {pragma} saying {e.args}')
+            with pool['lock']:
+                pool['all'].append(con)
+        local.con = con
+        local.refs = 1
+        return con.cursor()
+    def release_db_connection(self,con=None,force=False):
+        # give back the connection bound to the current thread to the pool
+        pool = self.get_db_pool()
+        local = pool['local']
+        current = getattr(local,'con',None)
+        if con is None:
+            con = current
+        if con is None or con is not current:
+            # already released, the connection may belong to another thread now
+            return None
+        local.refs -= 1
+        if local.refs > 0 and not force:
+            return con
+        local.con = None
+        local.refs = 0
+        if con.in_transaction:
+            con.rollback() # same as closing with uncommitted changes
+        with pool['lock']:
+            if len(pool['idle']) < self.app.config.get('DB_POOL_SIZE',8):
+                pool['idle'].append(con)
+                return None
+            pool['all'].remove(con)
+        self.sqlite3.Connection.close(con)
+        return None
+    def close_db_pool(self):
+        # close all the connections created by the pool
+        pool = self.__dict__.get('_pool_',None)
+        if pool is None:
+            return
+        with pool['lock']:
+            for con in pool['all']:
+                try:
+                    self.sqlite3.Connection.close(con)
+                except Exception as e:
+                    print(f'ERROR: Unable to close connection saying {e.__class__.__name__}-{e.args}')
+            pool['all'].clear()
+            pool['idle'].clear()
+    def handle_teardown(self,exception=None):
+        # release the connection left bound to this thread by the request
+        if self.__dict__.get('_pool_',None) is not None:
+            self.release_db_connection(force=True)
     def create_default(self,cursor,id,tree):
         FMEA_Function().__nodeinband__({'title': 'Empty FMEA Sheet','id': id,\
         'parentid': None, 'sheet_author':'Anonymous', 'sheet_created': '',\
         'asset_description':'No asset... '}).update_leaf(cursor,tree=tree)
         return tree
+    def check_schema(self,cursor,nodes=None):
+        # verify that the tables of nodes exist and match their classes
+        # each table is checked against sqlite_master once, later calls only compare
+        # PRAGMA schema_version and skip the check while it does not change
+        if nodes is None:
+            nodes = [FMEA_Function(),FMEA_Failure_Mode(),FMEA_Action(),FMEA_Domain()]
+        registry = self.__dict__.get('_schemas_',None)
+        if registry is None:
+            registry = dict()
+            self._schemas_ = registry
+        db_schema = registry.setdefault(self.app.config['db_file'],\
+                                        {'version': None, 'tables': set()})
+        version = cursor.execute('PRAGMA schema_version').fetchone()[0]
+        if version != db_schema['version']:
+            db_schema['tables'] = set()
+            db_schema['version'] = version
+        to_check = list(filter(lambda x:x.__sqlitetable__() not in db_schema['tables'],nodes))
+        if len(to_check) == 0:
+            return True
+        installed = False
+        for node in to_check:
+            if node.__sqlitecreate__(cursor) != 'SELECT \"TABLE EXISTS\"':
+                self.app_install(cursor) # create the database
+                installed = True
+                break
+        if installed:
+            nodes = [FMEA_Function(),FMEA_Failure_Mode(),FMEA_Action(),FMEA_Domain()]
+            db_schema['version'] = cursor.execute('PRAGMA schema_version').fetchone()[0]
+            db_schema['tables'] = set()
+        for node in nodes:
+            db_schema['tables'].add(node.__sqlitetable__())
+        if self.app_migrate(cursor,db_schema['tables']):
+            db_schema['version'] = cursor.execute('PRAGMA schema_version').fetchone()[0]
+        if any(isinstance(node,FMEA_Action) for node in to_check):
+            # actions stored without links (older versions, outside tools) get them here,
+            # once per schema check, the reads (previews, exports) only follow the links
+            FMEA_Action().__mtmlinkrepair__(cursor)
+        return installed == False
     def get_sheets(self,cursor=None):
         # list all sheets in order to select opening
         if cursor is None:
             cursor = self.get_db_connection()
-        if FMEA_Function().__sqlitecreate__(cursor) != 'SELECT \"TABLE EXISTS\"':
-            self.app_install(cursor)
+        self.check_schema(cursor,[FMEA_Function()])
         sheets = FMEA_Function().get_from_db(cursor,sheetid=None,tree=[])
         if len(sheets)==0: # Nothing in the sheet list
             sheets=self.create_default(cursor,0,sheets)
@@ -1319,41 +1964,210 @@ class FMEA_App(AttrAccess):
         # list the sheet tree of functions and failure causes
         if cursor is None:
             cursor = self.get_db_connection()
-        if FMEA_Function().__sqlitecreate__(cursor) != 'SELECT \"TABLE EXISTS\"' or\
-           FMEA_Failure_Mode().__sqlitecreate__(cursor) != 'SELECT \"TABLE EXISTS\"':
-            self.app_install(cursor) # create the database
-        tree = FMEA_Function().get_from_db(cursor,id,[])
-        tree = FMEA_Failure_Mode().get_from_db(cursor,id,tree)
+        self.check_schema(cursor,[FMEA_Function(),FMEA_Failure_Mode()])
+        tree = FMEA_Function().bulk_from_db(cursor,id,[])
+        tree = FMEA_Failure_Mode().bulk_from_db(cursor,id,tree)
         if len(tree)==0: # Nothing in the sheet
             tree = self.create_default(cursor,id,tree)
         return tree[0].__treesort__(tree) #prefer it to be pre-sorted
+    def iter_sheet_tree(self,cursor=None,id=0):
+        # yield the leafs of a sheet in the pre-order of __treesort__ while reading it,
+        # the children of a leaf are read once it is reached, leafs out of reach of
+        # the sheet come last ordered by id, nothing is yielded without a sheet
+        if cursor is None:
+            cursor = self.get_db_connection()
+        self.check_schema(cursor,[FMEA_Function(),FMEA_Failure_Mode()])
+        root = FMEA_Function().__nodeinband__({'id':id})
+        if root.__sqliteself__(cursor,'parentid IS NULL') is None:
+            return
+        root._path_ = [root.id]
+        placed = set()
+        waiting = [root]
+        while len(waiting) > 0:
+            leaf = waiting.pop()
+            placed.add(str(leaf.id))
+            yield leaf
+            children = FMEA_Failure_Mode().__sqliteall__(cursor,extra_where=\
+                       'sheetid = ? AND parentid = ?',params=(id,leaf.id))
+            if leaf is root:
+                # functions only hang from the sheet
+                children.extend(FMEA_Function().__sqliteall__(cursor,extra_where=\
+                                'parentid = ?',params=(leaf.id,)))
+            for child in sorted(children,key=root.__treeidkey__,reverse=True):
+                child._path_ = leaf._path_.copy()
+                child._path_.append(child.id)
+                waiting.append(child)
+        unplaced = list(filter(lambda x:str(x.id) not in placed,\
+                    FMEA_Failure_Mode().__sqliteiter__(cursor,'sheetid = ?',(id,))))
+        yield from sorted(unplaced,key=root.__treeidkey__)
+    def iter_sheet_action_risks(self,cursor=None,id=0):
+        # yield (action, risk levels of its failure modes in the sheet) from the last
+        # action of the sheet to the first, then (None, []) when an action of another
+        # sheet still comes after them in the whole action list
+        if cursor is None:
+            cursor = self.get_db_connection()
+        fm = FMEA_Failure_Mode()
+        link = FMEA_Action().__mtmlinktable__()
+        last = None
+        for act in FMEA_Action().__sqliteiter__(cursor,extra_where=f'''parentlist IS NOT NULL
+                AND id IN (SELECT {link}.id FROM {link} JOIN {fm.__sqlitetable__()} ON
+                {fm.__sqlitetable__()}.id = {link}.parentid WHERE sheetid = ?)''',\
+                params=(id,),order_by='id DESC'):
+            risks = fm.__sqliteall__(cursor,extra_where=\
+                    f'sheetid = ? AND id IN (SELECT parentid FROM {link} WHERE id = ?)',\
+                    params=(id,act.id))
+            last = act.id
+            yield act,sorted(set(map(lambda x:x.risk_level,risks)),key=str) # same order on every run
+        if last is not None and next(FMEA_Action().__sqliteiter__(cursor,\
+                'parentlist IS NOT NULL AND id < ?',(last,),limit=1),None) is not None:
+            yield None,[]
+    def get_sheet_revision(self,cursor=None,id=0,actions=False):
+        # the revisions of a sheet and of the domain, with actions also the revision of
+        # all actions, bumped by the database triggers on every write (see
+        # app_revision_triggers), None when they cannot be read
+        if cursor is None:
+            cursor = self.get_db_connection()
+        self.check_schema(cursor,[FMEA_Function(),FMEA_Failure_Mode(),FMEA_Action()])
+        try:
+            ids = [int(id),self.revision_domain]+([self.revision_actions] if actions else [])
+            rows = dict(cursor.execute(f'SELECT id, revision FROM {self.revision_table} '\
+                        f'WHERE id IN ({", ".join("?"*len(ids))})',ids).fetchall())
+        except Exception as e:
+            print(f'ERROR: Revision lookup failed with {e.__class__.__name__} saying {e.args}')
+            return None
+        return tuple(rows.get(i,0) for i in ids)
     def get_action_list(self,cursor=None,tree=[]):
         # get the actions, related to a tree
         if cursor is None:
             cursor = self.get_db_connection()
-        if FMEA_Action().__sqlitecreate__(cursor) != 'SELECT \"TABLE EXISTS\"':
-            # we should never get here!
-            self.app_install(cursor)
-        return FMEA_Action().get_from_db(cursor,tree,[])
+        self.check_schema(cursor,[FMEA_Action()])
+        return FMEA_Action().bulk_from_db(cursor,tree,LinkList())
+    def get_sheet_leaf(self,cursor=None,id=0,leaf_class=None):
+        # fetch one leaf and the path to its sheet by walking up the parents,
+        # one primary key lookup per level instead of loading the whole sheet
+        if cursor is None:
+            cursor = self.get_db_connection()
+        self.check_schema(cursor,[FMEA_Function(),FMEA_Failure_Mode()])
+        classes = {'FMEA_Function':FMEA_Function,'FMEA_Failure_Mode':FMEA_Failure_Mode}
+        if leaf_class is None:
+            leaf_class = FMEA_Function
+        leaf = leaf_class().__nodeinband__({'id':id})
+        if leaf.__sqliteself__(cursor) is None:
+            return None
+        path = [leaf.id]
+        node = leaf
+        while node.parentid is not None and node.parentid != '':
+            parent_class = classes.get(node.parentclass,FMEA_Function)
+            if type(node) == FMEA_Function:
+                parent_class = FMEA_Function # functions only hang from sheets
+            parent = parent_class().__nodeinband__({'id':node.parentid})
+            if parent.__sqliteself__(cursor) is None or parent.id in path:
+                print(f'WARNING: Leaf {leaf.id} has no valid path from its sheet')
+                return None
+            path.insert(0,parent.id)
+            node = parent
+        leaf._path_ = path
+        return leaf
+    def get_leaf_actions(self,cursor=None,leaf=None):
+        # get the actions of one leaf, answered by the link table index
+        if cursor is None:
+            cursor = self.get_db_connection()
+        self.check_schema(cursor,[FMEA_Action()])
+        ids = FMEA_Action().__mtmlinkchildren__(cursor,leaf.id)
+        if len(ids) == 0:
+            return []
+        return FMEA_Action().__sqliteall__(cursor,extra_where=f'id IN ({", ".join("?"*len(ids))})',\
+                                           params=tuple(ids))
     def get_domain_list(self,cursor=None,for_class=None):
         # get the domain for usage in generation of options and dialogs
         if cursor is None:
             cursor = self.get_db_connection()
-        if FMEA_Domain().__sqlitecreate__(cursor) != 'SELECT \"TABLE EXISTS\"':
-            # we should never get here!
-            self.app_install(cursor)
-        # TODO: See if you can cache this into flask app config
+        self.check_schema(cursor,[FMEA_Domain()])
+        # the rules are cached per database file and table, a write through FMEA_Domain,
+        # a schema change (reinstall, migration) or a domain revision written by another
+        # process rebuilds the cache
+        db_file = self.app.config['db_file']
+        version = (FMEA_Domain._revision_,self._schemas_[db_file]['version'],\
+                   self.get_sheet_revision(cursor,self.revision_domain))
+        caches = self.__dict__.get('_domains_',None)
+        if caches is None:
+            caches = dict()
+            self._domains_ = caches
+        cache = caches.get(db_file,None)
+        if cache is None or cache['version'] != version:
+            rules = DomainList(FMEA_Domain().bulk_from_db(cursor,[]))
+            tables = dict()
+            for rule in rules:
+                tables.setdefault(rule.table_name,DomainList()).append(rule)
+            cache = {'version': version, 'rules': rules, 'tables': tables}
+            caches[db_file] = cache
         if for_class is None:
-            return FMEA_Domain().get_from_db(cursor,[])
+            return cache['rules'].__domaincopy__()
         else:
             if type(for_class).__name__.find('FMEA')>=0:
                 for_class = for_class.__sqlitetable__()
             else:
                 for_class = for_class.lower()
-            return list(filter(lambda x:x['table_name']==for_class,\
-                FMEA_Domain().get_from_db(cursor,[])))
+            return cache['tables'].get(for_class,DomainList()).__domaincopy__()
+    def get_asset(self,name):
+        # build once a static asset named kind[-option...] with its hash and gzip body
+        assets = self.__dict__.get('_assets_',None)
+        if assets is None:
+            assets = dict()
+            self._assets_ = assets
+        asset = assets.get(name,None)
+        if asset is not None:
+            return asset
+        kind = name.split('-')[0]
+        options = list(filter(lambda x:x != '',name.split('-')[1:]))
+        allowed = self.app.config['STATIC_ASSETS'].get(kind,None)
+        if allowed is None or len(list(filter(lambda x:x not in allowed,options))) > 0:
+            return None
+        if kind == 'css':
+            body = self.compile_css(options=options).encode('utf-8')
+            mimetype, extension = 'text/css', 'css'
+        elif kind == 'js':
+            body = self.compile_js(options=options).encode('utf-8')
+            mimetype, extension = 'application/javascript', 'js'
+        else:
+            body = self.compile_icon()
+            mimetype, extension = 'image/png', 'png'
+        asset = {'body': body, 'etag': self.sha256(body).hexdigest()[:16],\
+                 'mimetype': mimetype, 'extension': extension,\
+                 'gzip': self.gzip_compress(body,9) if kind != 'icon' else None}
+        assets[name] = asset
+        return asset
+    def asset_url(self,kind,options=[]):
+        # versioned url of a static asset, the content hash changes with the content
+        name = '-'.join([kind]+sorted(set(options)))
+        asset = self.get_asset(name)
+        return self.url_for('fmea_asset',name=f'{name}.{asset["etag"]}.{asset["extension"]}')
+    def handle_asset(self,name):
+        # serve a static asset, a matching version is cached by browsers for long
+        key = name.split('.')[0]
+        version = (name.split('.')+[''])[1]
+        asset = self.get_asset(key)
+        if asset is None:
+            return self.app.response_class('Not found',status=404)
+        headers = {'ETag': f'"{asset["etag"]}"', 'Vary': 'Accept-Encoding'}
+        if version == asset['etag']:
+            headers['Cache-Control'] = f'public, max-age={self.app.config["STATIC_MAX_AGE"]}, immutable'
+        else:
+            headers['Cache-Control'] = 'no-cache' # an old version, revalidate
+        if asset['etag'] in self.request.if_none_match:
+            return self.app.response_class(status=304,headers=headers)
+        body = asset['body']
+        if asset['gzip'] is not None and 'gzip' in self.request.accept_encodings:
+            body = asset['gzip']
+            headers['Content-Encoding'] = 'gzip'
+        return self.app.response_class(body,mimetype=asset['mimetype'],headers=headers)
     def derive_template(self,base='',title='',header='',footer='',\
                         content='',css='',js='',icon=''):
+        # css, js and icon are the urls of the static assets, see asset_url
+        return ''.join(self.iter_template(base,title,header,footer,[content],css,js,icon))
+    def iter_template(self,base='',title='',header='',footer='',\
+                        content=[],css='',js='',icon=''):
+        # yield the page as fragments, content is an iterable of fragments
         if header == '':
             header = f'''<a class="a-header-index" href="{self.url_for("fmea_index")}">
             Sheets</a>'''
@@ -1361,25 +2175,48 @@ class FMEA_App(AttrAccess):
             footer = '''<span> Copyright&copy; <a href="mailto:mihaigabriel.vasile23@gmail.com">
             Mihai-Gabriel Vasile</a>&nbsp;2023</span>'''
         if icon == '':
-            icon = 'data:image/x-icon;base64,iVBORw0KGgoAAAANSUhEUgAAAEAAAAA5CAYAAACGRC3XAAAA0GVYSWZJSSoACAAAAAoAAAEEAAEAAABAAAAAAQEEAAEAAAA5AAAAAgEDAAMAAACGAAAAEgEDAAEAAAABAAAAGgEFAAEAAACMAAAAGwEFAAEAAACUAAAAKAEDAAEAAAADAAAAMQECAA0AAACcAAAAMgECABQAAACqAAAAaYcEAAEAAAC+AAAAAAAAAAgACAAIAAoAAAABAAAACgAAAAEAAABHSU1QIDIuMTAuMzQAADIwMjM6MDk6MTcgMTU6NTk6NTcAAQABoAMAAQAAAAEAAAAAAAAAlHnM9AAAAYRpQ0NQSUNDIHByb2ZpbGUAAHicfZE9SMNAHMVfU8UPKiJ2EHHIUJ3soiLiVKtQhAqhVmjVweTSL2jSkKS4OAquBQc/FqsOLs66OrgKguAHiKuLk6KLlPi/pNAixoPjfry797h7Bwj1MtOsjhig6baZSsTFTHZV7HpFDwYQwiwEmVnGnCQl4Tu+7hHg612UZ/mf+3P0qTmLAQGROMYM0ybeIJ7etA3O+8RhVpRV4nPicZMuSPzIdcXjN84FlwWeGTbTqXniMLFYaGOljVnR1IiniCOqplO+kPFY5bzFWStXWfOe/IWhnL6yzHWaI0hgEUuQIEJBFSWUYSNKq06KhRTtx338w65fIpdCrhIYORZQgQbZ9YP/we9urfzkhJcUigOdL47zMQp07QKNmuN8HztO4wQIPgNXestfqQMzn6TXWlrkCOjfBi6uW5qyB1zuAENPhmzKrhSkKeTzwPsZfVMWGLwFete83pr7OH0A0tRV8gY4OATGCpS97vPu7vbe/j3T7O8HkFBysq4qbTUAAA14aVRYdFhNTDpjb20uYWRvYmUueG1wAAAAAAA8P3hwYWNrZXQgYmVnaW49Iu+7vyIgaWQ9Ilc1TTBNcENlaGlIenJlU3pOVGN6a2M5ZCI/Pgo8eDp4bXBtZXRhIHhtbG5zOng9ImFkb2JlOm5zOm1ldGEvIiB4OnhtcHRrPSJYTVAgQ29yZSA0LjQuMC1FeGl2MiI+CiA8cmRmOlJERiB4bWxuczpyZGY9Imh0dHA6Ly93d3cudzMub3JnLzE5OTkvMDIvMjItcmRmLXN5bnRheC1ucyMiPgogIDxyZGY6RGVzY3JpcHRpb24gcmRmOmFib3V0PSIiCiAgICB4bWxuczp4bXBNTT0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wL21tLyIKICAgIHhtbG5zOnN0RXZ0PSJodHRwOi8vbnMuYWRvYmUuY29tL3hhcC8xLjAvc1R5cGUvUmVzb3VyY2VFdmVudCMiCiAgICB4bWxuczpkYz0iaHR0cDovL3B1cmwub3JnL2RjL2VsZW1lbnRzLzEuMS8iCiAgICB4bWxuczpHSU1QPSJodHRwOi8vd3d3LmdpbXAub3JnL3htcC8iCiAgICB4bWxuczp0aWZmPSJodHRwOi8vbnMuYWRvYmUuY29tL3RpZmYvMS4wLyIKICAgIHhtbG5zOnhtcD0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wLyIKICAgeG1wTU06RG9jdW1lbnRJRD0iZ2ltcDpkb2NpZDpnaW1wOmExMjI1N2YzLTFhY2UtNDgxMC1iNTM3LTc1Mjk0NjViMzE3NyIKICAgeG1wTU06SW5zdGFuY2VJRD0ieG1wLmlpZDo0NjA5YTE2Ny02MDFkLTQ5NTYtYjlkMy0yYmFlODVkYmZlYWIiCiAgIHhtcE1NOk9yaWdpbmFsRG9jdW1lbnRJRD0ieG1wLmRpZDowMDZlMzM2ZC1iMDIwLTRkNjQtOGFmNS0wMTc2Zjk0NzJhN2MiCiAgIGRjOkZvcm1hdD0iaW1hZ2UvcG5nIgogICBHSU1QOkFQST0iMi4wIgogICBHSU1QOlBsYXRmb3JtPSJMaW51eCIKICAgR0lNUDpUaW1lU3RhbXA9IjE2OTQ5NTU2MDI4NTY1MDUiCiAgIEdJTVA6VmVyc2lvbj0iMi4xMC4zNCIKICAgdGlmZjpPcmllbnRhdGlvbj0iMSIKICAgeG1wOkNyZWF0b3JUb29sPSJHSU1QIDIuMTAiCiAgIHhtcDpNZXRhZGF0YURhdGU9IjIwMjM6MDk6MTdUMTU6NTk6NTcrMDM6MDAiCiAgIHhtcDpNb2RpZnlEYXRlPSIyMDIzOjA5OjE3VDE1OjU5OjU3KzAzOjAwIj4KICAgPHhtcE1NOkhpc3Rvcnk+CiAgICA8cmRmOlNlcT4KICAgICA8cmRmOmxpCiAgICAgIHN0RXZ0OmFjdGlvbj0ic2F2ZWQiCiAgICAgIHN0RXZ0OmNoYW5nZWQ9Ii8iCiAgICAgIHN0RXZ0Omluc3RhbmNlSUQ9InhtcC5paWQ6ZDlhMjJkMTEtZGUyOC00ZmJkLWI4M2UtN2U0NzU0ZmI0NzMxIgogICAgICBzdEV2dDpzb2Z0d2FyZUFnZW50PSJHaW1wIDIuMTAgKExpbnV4KSIKICAgICAgc3RFdnQ6d2hlbj0iMjAyMy0wOS0xN1QxNjowMDowMiswMzowMCIvPgogICAgPC9yZGY6U2VxPgogICA8L3htcE1NOkhpc3Rvcnk+CiAgPC9yZGY6RGVzY3JpcHRpb24+CiA8L3JkZjpSREY+CjwveDp4bXBtZXRhPgogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgCjw/eHBhY2tldCBlbmQ9InciPz7aLHOKAAAABmJLR0QA/wD/AP+gvaeTAAAACXBIWXMAAAPoAAAD6AG1e1JrAAAAB3RJTUUH5wkRDQACxPYhbgAABilJREFUaN7lWj2TG0UQfT0zK+msO53kKzBVQJEQOMEFFJASOSAkISDjx8C/cUBKQEBEEQABFIk/yuWyoXzG1t3p7vSxO00g7e7s7Mzu7EqysU7RqDW76u5502/29dI3333LuMIf1e108NG7RwAliDXhxeQCQkjs7/UgJDBjgkwYT569wPFktnsJmM3n+Pne31cXAbc/vQkAIMNIYIcNlo2XY/LN44pr0zss5zCbtnzA5jy2fndex4XrMrt1rXk/Op4+4DQY0/lsnAXombP63UxaPm91DZXvy5w7k409NjtRG7GtciDMteYSBhxZt+dwAQ/ZHHaMC9dTGTU+G62+bdS2Mgi/w2TBLCQp9pgKcGYj0TmScmc2YTO/1NmIAFEVYO0q1qDAvQ+p4IA9JgcKaItoEU1h7l1tbyKpGimGM/DA1GXbDILSLcDN9z4jICkhKIADBaG2tRFEaRE0HaYaFPgDZC9SwlGwDpwrEeRBgchWlANWsQXMS0ipQMG6ha4NWoQdIDtgvglahLOg5velV0SLIiTA7dFiec42Cl0VggQaBPg60iJqUCCaraKfFnkLtEgvgRaFkwFa0CK2QIt4CbQouHblX19aDEGQMAMsMMAO0GIIgkRdgLtOi60eh91IaVcvKmlxK+f/ok3U7n1ukhS0rhfBzwmBtBiKIAUGOIMHF57V03EcJzg5Oy8qRZbqA0s56nUiHPT3CgoQUZoUQxkCZal1/TcIIM6vYdNGhv7lsq1WPLVRdt/cptI/Yisz6USA8esfd8FJM7HxyfFzfP3FZ5nb/v8wkrIymEkhW0Viy19aJddloxzBThsA5Vod20mdaBwNDxsl4GRyYQmgKASIAgpQPa5CwTo24hwB9qqzCaGWknOOLj/MASBJNO78+Du6nah0D3LUDLuQaB3jy88/MCC+3NY2WlwIUunXHAUuJyk8aObSGaIO5os4gep08dYb16EiFfxfWi+jefj4aQ5tI/oQFKiCkxUFMf2cTS4RxzGEFIgihcv5AhzHkCrCcNC39PcaaBtbDgC0kbln4wmkFFBSYjZfoCs0ZgkghMDhQR9SuBfFVeiqbMqGvcthAEsnOhG63Qh7vQg6ScBCYrgfgbWGXi4rTsZj9K71M2j/9uf96oYKMz68+R50nGB8do43j4YAgEG/lyGqG/WgBGGPAc0aaezHJ2c47F/L+T2NwSp0PhsIOQLS3Z7CyK4F6f7srCD6YnIBCAGdJDg4OEBHLY8Uw9EoC1VKiU9uvW9RZ7npMp3NIZTE6HA/u7YTKUynl5jHGkkcQyoFZsbhQT7nxmhQlsI4nCoJcBXBYtEhTwEaDQdOCCZag4gKRdXmfZsWnb0uAL3eHnoVNSBJNEiQcw+EUqWCiwEctBj6kUI4mcA5XhmUkljMZ/jn+N/akutiBcnx0t8WtKjqixVh/U/16U9Kia9uf2ydMPPtEtpb9J/8/LSoyhxdpkUhBZ6PzxqFfH45zU9eDU9//q1IhYarq6jBaaugxQcXjwrd4VInmIAkSXB6OikVM3hWJ30W2O/3MmfDOszNutCcPUnWd5h9NuU7/Zm0qKTE9dHAcqyYBJfzRtfe5BnAi4L6euF7Tmhy/jdpUfgfb6kkioTL32GPw+yQz7Bt+cySxQQaBLiWZhAYYFN1KVT/98liIkgQZV9j1PVKy2ZetqjvQdgvW6zTGWoEc6rpFrcRUcO6SlyQz9qLqCZaHLI41aAgPMBmLfQGXSXHfZu2xQ1N0C52Fau4AZgzt0iKR0RFjYgaIqyKugDdsvj6Iiqq5PZNiqg1wqpovPd3jBaFH17htNiqhd6QFnlLtCiarWKDFvqGaREhLNOCFgU7Tn+boMUgh/8HtCjqT3y7TYuiKsCrQIvVL0peAVoUlTDfOC02e9niZdCiCH2jazO0iFdIi+4XK4Sriu4mLcKJAnXn+x9KsqfzO7ncRcC1HDSXCgYO86k09l/HrrYiA+ruwye4yh/V63Vx6+1DaC0gVQKhIixEBH1xifEMeGcQYZokeD6+wI1RH/GCMdXAeaIx6AiQkhggxtPzBWR3D8Mu8NNfj1+fBEynM/xy7ymkkOhIoKskxpfzbMJ9AyB3j093DgH/AUoFKSW6y1w4AAAAAElFTkSuQmCC'
+            icon = self.asset_url('icon')
         if base == '':
-            return f'''<!doctype html>
+            yield f'''<!doctype html>
             <html>
              <head>
               <title>{title}</title>
-              <link rel="shortcut icon" href="{icon}" type="image/x-icon">
-              <style type="text/css">{css}</style>
-              <script type="text/javascript">{js}</script>
+              <link rel="shortcut icon" href="{icon}" type="image/png">
+              <link rel="stylesheet" type="text/css" href="{css}">
+              <script type="text/javascript" src="{js}"></script>
              </head>
              <body onload="FMEA_Init()">
               <header class="header">{header}</header>
-              <div class="content">{content}</div>
+              <div class="content">'''
+            yield from content
+            yield f'''</div>
               <footer class="footer">{footer}</footer>
              </body>
             </html>'''
         else:
-            return base.format(title=title,header=header,footer=footer,\
-                                content=content,css=css,js=js)
+            yield base.format(title=title,header=header,footer=footer,\
+                                content=''.join(content),css=css,js=js)
+    def stream_page(self,parts,mimetype='text/html',headers=None):
+        # send html fragments as a streamed response, grouped in chunks of
+        # STREAM_CHUNK_SIZE characters so small fragments do not become small writes
+        if not self.app.config.get('STREAM_PAGES',False):
+            if mimetype == 'text/html' and headers is None:
+                return self.Markup(''.join(parts))
+            return self.app.response_class(''.join(parts),mimetype=mimetype,headers=headers)
+        def chunks(parts=parts,size=self.app.config['STREAM_CHUNK_SIZE']):
+            buffer = []
+            buffered = 0
+            for part in parts:
+                buffer.append(part)
+                buffered += len(part)
+                if buffered >= size:
+                    yield ''.join(buffer)
+                    buffer = []
+                    buffered = 0
+            if buffered > 0:
+                yield ''.join(buffer)
+        return self.app.response_class(self.stream_with_context(chunks()),mimetype=mimetype,\
+                                       headers=headers)
     def derive_headers(self,pagename='index',sheet_id=0):
         # generate function HTML for a page type
         if pagename=='index' or pagename=='open':
@@ -1489,8 +2326,12 @@ class FMEA_App(AttrAccess):
      </div></div>''' # TODO: Implement drag/drop
     def derive_tree(self,tree,tree_query=None,domain=None,actions=None,debug=False):
         # generate the tree HTML
+        return ''.join(self.iter_tree(tree,tree_query,domain,actions,debug))
+    def iter_tree(self,tree,tree_query=None,domain=None,actions=None,debug=False):
+        # yield the tree HTML leaf by leaf
         if len(tree)==0:
-            return '<p>No data to display</p>'
+            yield '<p>No data to display</p>'
+            return
         else:
             tree = tree[0].__treesort__(tree)
             if tree_query is not None:
@@ -1498,41 +2339,46 @@ class FMEA_App(AttrAccess):
                 vi = tree_query.get('id',[])
             if debug:
                 print(f'DEBUG: Sorted tree looks like {list(l._path_ for l in tree)}')
-        result = ''
         prev_leaf = None
+        act_index = FMEA_Action().__mtmindex__(actions if actions is not None else [])
         for leaf in tree:
             if prev_leaf is None:
                 # we are dealing with the root node
-                result = f'''
+                yield f'''
                     <ul id="{leaf.__htmlid__("fmeatl")}" class="fmeatl">
                     <li id="{leaf.__htmlid__("fmeatb")}" class="fmeatb" >
                     {self.derive_leaf(leaf)}''' # the root node never has actions
             else:
-                leaf_actions = list(filter(lambda x:leaf.id in list(map(lambda y:int(y.strip()) if y.strip().isnumeric() else None,x.parentlist.split(','))),actions))
+                leaf_actions = list(act_index.get(leaf.id,[]))
                 if debug: print(f'DEBUG: Found for leaf {leaf.id} actions {leaf_actions}')
                 if prev_leaf.id == leaf.parentid:
-                    result = f'''{result}
+                    yield f'''
                     <ul id="fmea_tree_lvl_{len(leaf._path_)-1}" class="fmea_tree_lvl">
                     <li id="fmea_tree_br_{leaf.id}" class="fmea_tree_br" >
                     {self.derive_leaf(leaf,leaf_acts=leaf_actions,leaf_dom=domain)}'''
                 else:
                     if prev_leaf.parentid == leaf.parentid:
-                        result = f'''{result}</li>
+                        yield f'''</li>
                         <li id="fmea_tree_br_{leaf.id}" class="fmea_tree_br" >
                         {self.derive_leaf(leaf,leaf_acts=leaf_actions,leaf_dom=domain)}'''
                     else:
                         repeat_pattern = len(prev_leaf._path_)-len(leaf._path_)
-                        result = f'''{result}{"</li></ul>"*repeat_pattern}
+                        yield f'''{"</li></ul>"*repeat_pattern}
                             <li id="fmea_tree_br_{leaf.id}" class="fmea_tree_br" >
                             {self.derive_leaf(leaf,leaf_acts=leaf_actions,leaf_dom=domain)}'''
             prev_leaf = leaf
-        for i in range(len(prev_leaf._path_)):
-            result = f'{result}'
-        return result
+    def iter_patch(self,fragments):
+        # yield (html id, html) fragments the client swaps in place, an empty html
+        # removes the element
+        for target,html in fragments:
+            yield f'<template data-target="{target}">'
+            yield html
+            yield '</template>'
     def derive_action_legend(self,domain,tiny=False,debug=True):
         # generate a colored legend for action types
-        action_types = list(filter(lambda x:x.table_name == 'fmea_action' and\
-         x.field_name == 'category',domain))
+        if not isinstance(domain,DomainList):
+            domain = DomainList(domain)
+        action_types = domain.__domainfield__('fmea_action','category')['rules']
         if len(action_types) <= 0:
             return '<div id="act-legend" class="act-legend"><h3>No legend</h3></div>'
         else:
@@ -1546,28 +2392,27 @@ class FMEA_App(AttrAccess):
             </div> </div>'''
     def derive_action_list(self,actions,domain,tree=[],tiny=False,debug=False):
         # generate the action list, search and filter functions
+        return ''.join(self.iter_action_list(actions,domain,tree,tiny,debug))
+    def iter_action_list(self,actions,domain,tree=[],tiny=False,debug=False):
+        # yield the action list action by action
         if len(tree) == 0 and not tiny:
-            return '<span>No actions have been added within the sheet</span>'
+            yield '<span>No actions have been added within the sheet</span>'
+            return
         if len(tree) == 0 and tiny:
-            return '<span>[]</span>'
+            yield '<span>[]</span>'
+            return
         search_node = FMEA_Failure_Mode().__nodename__()
         tree_ids = list(map(lambda x:x.id,filter(lambda y:y.__nodename__()==\
             search_node,tree)))
         select_actions = []
-        source_actions = actions.copy()
+        act_index = FMEA_Action().__mtmindex__(actions)
         for id in tree_ids:
             # we want to list actions as sorted by tree path
-            for act in source_actions:
-                parent_list = act.parentlist.split(',')
-                #if debug: print(f'DEBUG: Converted {act.parentlist} into {parent_list}')
-                if str(id) in parent_list:
-                    select_actions.append(act)
-                    #source_actions.remove(act)
+            select_actions.extend(act_index.get(id,[]))
         search_table = FMEA_Action().__sqlitetable__()
-        render_list = ''
-        category_colors = dict(map(lambda v:tuple([v.field_option, \
-          v.field_option_color]),filter(lambda x:x.table_name == search_table \
-                                         and x.field_name == 'category',domain)))
+        if not isinstance(domain,DomainList):
+            domain = DomainList(domain)
+        category_colors = domain.__domainfield__(search_table,'category')['colors']
         if len(tree) == 1:
             parent_id = tree[0].id
         else:
@@ -1575,13 +2420,11 @@ class FMEA_App(AttrAccess):
         if debug: print(f'DEBUG: Selected from {list(f"{a.id}:{a.parentlist} " for a in actions)} just {list(f"{a.id}:{a.parentlist} " for a in select_actions)}')
         at_most_5 = 5
         for ac in select_actions:
-            parents = ac.parentlist.split(',')
-            parent_lookup = ''
-            for p in parents:
-                parent_lookup = f'''{parent_lookup}
-     <a href="#" onclick="navigateAndHighlight('fmeald-fmeafm-{p.strip()}');return false" >#{p.strip()}</a>&nbsp;'''
             if not tiny:
-                render_list = f'''{render_list}
+                parent_lookup = ''.join(f'''
+     <a href="#" onclick="navigateAndHighlight('fmeald-fmeafm-{p}');return false" >#{p}</a>&nbsp;'''\
+                                        for p in ac.__mtmparentids__())
+                yield f'''
     <div id="{ac.__htmlid__('action')}" class="action" data-raw="{str(ac)}"
      style="background:{category_colors[ac.category] if ac.category!='' else ''};" >
      <a href="#" onclick="actionEdit({ac.id},{parent_id});return false">
@@ -1594,8 +2437,7 @@ class FMEA_App(AttrAccess):
                 at_most_5 -= 1
                 if at_most_5 <= 0:
                     if debug: break
-                render_list = f'''{render_list}<a href="#" onclick="actionEdit({ac.id},'*'  );return false" data-raw="{str(ac)}" style="font-size:1.5vmin;background:{category_colors[ac.category] if ac.category!='' else ''};">#{ac.id}</a>&nbsp;'''
-        return render_list
+                yield f'''<a href="#" onclick="actionEdit({ac.id},'*'  );return false" data-raw="{str(ac)}" style="font-size:1.5vmin;background:{category_colors[ac.category] if ac.category!='' else ''};">#{ac.id}</a>&nbsp;'''
     def derive_input_field(self,fieldrec,fieldvalue,domain,tree=[]):
         # fieldrec is a triplet of field name, field type, field hint
         # assumes the tree excludes sheet, self and children
@@ -1617,17 +2459,20 @@ class FMEA_App(AttrAccess):
         if len(options)>1:
             datalistid = f'edit-dl-{fieldrecx}'
             datalistsp = f' list="{datalistid}"'
+            datalistparts = []
             if fieldrec[2] is not None:
                 if len(fieldrec[2])>0:
-                    datalisttext = f'''
-    <option value="{fieldrec[2]}" selected disabled hidden>{fieldrec[2]}</option>'''
+                    datalistparts.append(f'''
+    <option value="{fieldrec[2]}" selected disabled hidden>{fieldrec[2]}</option>''')
             for opt in options:
                 if opt[0]==fieldvalue:
-                    datalisttext = f'''{datalisttext.replace('" selected','"')}
-    <option value="{opt[0]}" selected="selected" data-color="{opt[1]}">{opt[0]}</option>'''
+                    datalistparts = list(map(lambda x:x.replace('" selected','"'),datalistparts))
+                    datalistparts.append(f'''
+    <option value="{opt[0]}" selected="selected" data-color="{opt[1]}">{opt[0]}</option>''')
                 else:
-                    datalisttext = f'''{datalisttext}
-    <option value="{opt[0]}" data-color="{opt[1]}">{opt[0]}</option>'''
+                    datalistparts.append(f'''
+    <option value="{opt[0]}" data-color="{opt[1]}">{opt[0]}</option>''')
+            datalisttext = ''.join(datalistparts)
         if fieldrec[1] == 'text' or fieldrec[1] == '':
             if len(datalisttext)>0:
                 datalisttext= f'''
@@ -1638,14 +2483,10 @@ class FMEA_App(AttrAccess):
     id="edit-in-{fieldrecx}" value="{fieldvalue}" placeholder="{fieldrec[2]}"/></div>'''
         if fieldrec[1] == 'readonly':
             if fieldrec[0] == 'parentid':
-                parentopt =''
-                for leaf in tree:
-                    if leaf.id == fieldvalue:
-                        parentopt = f'''{parentopt}
-    <option value="{leaf.id}" selected="selected">{leaf.id}</option>'''
-                    else:
-                        parentopt = f'''{parentopt}
-    <option value="{leaf.id}">{leaf.id}</option>'''
+                parentopt = ''.join(f'''
+    <option value="{leaf.id}" selected="selected">{leaf.id}</option>''' if leaf.id == fieldvalue\
+                    else f'''
+    <option value="{leaf.id}">{leaf.id}</option>''' for leaf in tree)
                 if len(parentopt) == 0:
                     parentopt = f'''
     <option value="{fieldvalue}" selected="selected">{fieldvalue}</option>'''
@@ -1717,8 +2558,9 @@ class FMEA_App(AttrAccess):
                 # we are editing a failure cause
                 actions = self.get_action_list(cursor,[leaf])
                 formhtml = ''
-                leafdom = list(filter(lambda x:x.parentclass==leaf.__nodename__(),\
-                                     domain))
+                # rules are copied, the domain list is shared through the cache
+                leafdom = list(map(lambda x:x.__copy__(),filter(lambda x:\
+                                   x.parentclass==leaf.__nodename__(),domain)))
                 # here we manipulate domain to make distinction between Failure Mode
                 # and Failure Cause
                 parents = list(filter(lambda x:x.id == leaf.parentid,tree))
@@ -1761,9 +2603,10 @@ class FMEA_App(AttrAccess):
                         formhtml = f'''{formhtml}
             {self.derive_input_field(field,leaf[field[0]],leafdom,filtered_tree)}'''
                     add_actions = ''
+                    linked = set(ac.id for ac in FMEA_Action().__mtmchildren__(leaf.id,\
+                                 index=FMEA_Action().__mtmindex__(actions)))
                     for ac in actions:
-                        if leaf.id not in list(map(lambda x:int(x.strip()) if \
-                         x.strip().isnumeric() else -1,ac.parentlist.split(','))):
+                        if ac.id not in linked:
                              add_actions = f'''{add_actions}
     <option value="({ac.id}){ac.title}">({ac.id}){ac.title}</option>'''
                     if len(add_actions)>0:
@@ -1781,16 +2624,13 @@ class FMEA_App(AttrAccess):
         return formhtml
     def derive_node_list(self,actionid,treelist = []):
         # make list of nodes to delete from an action
-        result_list = ''
-        for le in treelist:
-            result_list = f'''{result_list}
+        return ''.join(f'''
             <div id="act-nl-{le.id}" class="action-node">
              <a href="#fmeald-fmeaf-{le.id}" onclick="navigateAndHighlight('fmeald-fmeafm-{le.id}');return false">({le.id}){le.title}</a>&nbsp;
              <span class="nodes-right">
               <a href="#" onclick="actionDelete({actionid},{le.id});return false">&#9746;</a>
              </span>
-            </div>'''
-        return result_list
+            </div>''' for le in treelist)
     def derive_action_edit(self,cursor,act,id=None,leafid=None,debug=True):
         # generate the HTML form to edit action details
         formhtml='<p>Action</p>'
@@ -1811,13 +2651,12 @@ class FMEA_App(AttrAccess):
         if leafid is None:
             actnew = FMEA_Action().__nodeinband__({'id':id})
             res = actnew.__sqliteself__(cursor)
-            if res is not None:
-                leafid = actnew.parentlist.split(',')[0].strip()
+            if res is not None and len(actnew.__mtmparentids__())>0:
+                leafid = str(actnew.__mtmparentids__()[0])
         if leafid is None:
-            pars = act.parentlist.split(',')
+            pars = act.__mtmparentids__()
             if len(pars)>0:
-                if pars[0].strip().isnumeric():
-                    leafid = pars[0].strip()
+                leafid = str(pars[0])
         nodes_list = []
         detected_sheetid = None
         presumed_node = FMEA_Failure_Mode().__nodeinband__({'id':int(leafid)})
@@ -1828,32 +2667,26 @@ class FMEA_App(AttrAccess):
             res = presumed_sheet.__sqliteself__(cursor)
             if res is None:
                 # let's give up and display the parentlist
-                for p in act.parentlist.split(','):
-                    if p.strip().isnumeric():
-                        presumed_parent = FMEA_Failure_Mode().__nodeinband__\
-                        ({'id':int(p.strip())})
-                        presumed_parent.__sqliteself__(cursor)
-                        nodes_list.append(presumed_parent)
+                for p in act.__mtmparentids__():
+                    presumed_parent = FMEA_Failure_Mode().__nodeinband__({'id':p})
+                    presumed_parent.__sqliteself__(cursor)
+                    nodes_list.append(presumed_parent)
             else:
                 # so parentlist filtered by sheet id
                 detected_sheetid = leafid
-                for p in act.parentlist.split(','):
-                    if p.strip().isnumeric():
-                        presumed_parent = FMEA_Failure_Mode().__nodeinband__\
-                        ({'id':int(p.strip())})
-                        presumed_parent.__sqliteself__(cursor)
-                        if presumed_parent.sheetid == leafid:
-                            nodes_list.append(presumed_parent)
+                for p in act.__mtmparentids__():
+                    presumed_parent = FMEA_Failure_Mode().__nodeinband__({'id':p})
+                    presumed_parent.__sqliteself__(cursor)
+                    if presumed_parent.sheetid == leafid:
+                        nodes_list.append(presumed_parent)
         else:
             # this is a tough one, should we use the node itself or those in the same sheet
             detected_sheetid = presumed_node.sheetid
-            for p in act.parentlist.split(','):
-                if p.strip().isnumeric():
-                    presumed_parent = FMEA_Failure_Mode().__nodeinband__\
-                     ({'id':int(p.strip())})
-                    presumed_parent.__sqliteself__(cursor)
-                    if presumed_parent.sheetid == presumed_node.sheetid:
-                        nodes_list.append(presumed_parent)
+            for p in act.__mtmparentids__():
+                presumed_parent = FMEA_Failure_Mode().__nodeinband__({'id':p})
+                presumed_parent.__sqliteself__(cursor)
+                if presumed_parent.sheetid == presumed_node.sheetid:
+                    nodes_list.append(presumed_parent)
         tree = []
         if detected_sheetid is not None:
             tree = self.get_sheet_tree(cursor,detected_sheetid)
@@ -2334,6 +3167,9 @@ class FMEA_App(AttrAccess):
     }'''
     # TODO: Add css for action list and forms
         return css_script
+    def compile_icon(self):
+        # the favicon as png bytes
+        return self.b64decode('iVBORw0KGgoAAAANSUhEUgAAAEAAAAA5CAYAAACGRC3XAAAA0GVYSWZJSSoACAAAAAoAAAEEAAEAAABAAAAAAQEEAAEAAAA5AAAAAgEDAAMAAACGAAAAEgEDAAEAAAABAAAAGgEFAAEAAACMAAAAGwEFAAEAAACUAAAAKAEDAAEAAAADAAAAMQECAA0AAACcAAAAMgECABQAAACqAAAAaYcEAAEAAAC+AAAAAAAAAAgACAAIAAoAAAABAAAACgAAAAEAAABHSU1QIDIuMTAuMzQAADIwMjM6MDk6MTcgMTU6NTk6NTcAAQABoAMAAQAAAAEAAAAAAAAAlHnM9AAAAYRpQ0NQSUNDIHByb2ZpbGUAAHicfZE9SMNAHMVfU8UPKiJ2EHHIUJ3soiLiVKtQhAqhVmjVweTSL2jSkKS4OAquBQc/FqsOLs66OrgKguAHiKuLk6KLlPi/pNAixoPjfry797h7Bwj1MtOsjhig6baZSsTFTHZV7HpFDwYQwiwEmVnGnCQl4Tu+7hHg612UZ/mf+3P0qTmLAQGROMYM0ybeIJ7etA3O+8RhVpRV4nPicZMuSPzIdcXjN84FlwWeGTbTqXniMLFYaGOljVnR1IiniCOqplO+kPFY5bzFWStXWfOe/IWhnL6yzHWaI0hgEUuQIEJBFSWUYSNKq06KhRTtx338w65fIpdCrhIYORZQgQbZ9YP/we9urfzkhJcUigOdL47zMQp07QKNmuN8HztO4wQIPgNXestfqQMzn6TXWlrkCOjfBi6uW5qyB1zuAENPhmzKrhSkKeTzwPsZfVMWGLwFete83pr7OH0A0tRV8gY4OATGCpS97vPu7vbe/j3T7O8HkFBysq4qbTUAAA14aVRYdFhNTDpjb20uYWRvYmUueG1wAAAAAAA8P3hwYWNrZXQgYmVnaW49Iu+7vyIgaWQ9Ilc1TTBNcENlaGlIenJlU3pOVGN6a2M5ZCI/Pgo8eDp4bXBtZXRhIHhtbG5zOng9ImFkb2JlOm5zOm1ldGEvIiB4OnhtcHRrPSJYTVAgQ29yZSA0LjQuMC1FeGl2MiI+CiA8cmRmOlJERiB4bWxuczpyZGY9Imh0dHA6Ly93d3cudzMub3JnLzE5OTkvMDIvMjItcmRmLXN5bnRheC1ucyMiPgogIDxyZGY6RGVzY3JpcHRpb24gcmRmOmFib3V0PSIiCiAgICB4bWxuczp4bXBNTT0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wL21tLyIKICAgIHhtbG5zOnN0RXZ0PSJodHRwOi8vbnMuYWRvYmUuY29tL3hhcC8xLjAvc1R5cGUvUmVzb3VyY2VFdmVudCMiCiAgICB4bWxuczpkYz0iaHR0cDovL3B1cmwub3JnL2RjL2VsZW1lbnRzLzEuMS8iCiAgICB4bWxuczpHSU1QPSJodHRwOi8vd3d3LmdpbXAub3JnL3htcC8iCiAgICB4bWxuczp0aWZmPSJodHRwOi8vbnMuYWRvYmUuY29tL3RpZmYvMS4wLyIKICAgIHhtbG5zOnhtcD0iaHR0cDovL25zLmFkb2JlLmNvbS94YXAvMS4wLyIKICAgeG1wTU06RG9jdW1lbnRJRD0iZ2ltcDpkb2NpZDpnaW1wOmExMjI1N2YzLTFhY2UtNDgxMC1iNTM3LTc1Mjk0NjViMzE3NyIKICAgeG1wTU06SW5zdGFuY2VJRD0ieG1wLmlpZDo0NjA5YTE2Ny02MDFkLTQ5NTYtYjlkMy0yYmFlODVkYmZlYWIiCiAgIHhtcE1NOk9yaWdpbmFsRG9jdW1lbnRJRD0ieG1wLmRpZDowMDZlMzM2ZC1iMDIwLTRkNjQtOGFmNS0wMTc2Zjk0NzJhN2MiCiAgIGRjOkZvcm1hdD0iaW1hZ2UvcG5nIgogICBHSU1QOkFQST0iMi4wIgogICBHSU1QOlBsYXRmb3JtPSJMaW51eCIKICAgR0lNUDpUaW1lU3RhbXA9IjE2OTQ5NTU2MDI4NTY1MDUiCiAgIEdJTVA6VmVyc2lvbj0iMi4xMC4zNCIKICAgdGlmZjpPcmllbnRhdGlvbj0iMSIKICAgeG1wOkNyZWF0b3JUb29sPSJHSU1QIDIuMTAiCiAgIHhtcDpNZXRhZGF0YURhdGU9IjIwMjM6MDk6MTdUMTU6NTk6NTcrMDM6MDAiCiAgIHhtcDpNb2RpZnlEYXRlPSIyMDIzOjA5OjE3VDE1OjU5OjU3KzAzOjAwIj4KICAgPHhtcE1NOkhpc3Rvcnk+CiAgICA8cmRmOlNlcT4KICAgICA8cmRmOmxpCiAgICAgIHN0RXZ0OmFjdGlvbj0ic2F2ZWQiCiAgICAgIHN0RXZ0OmNoYW5nZWQ9Ii8iCiAgICAgIHN0RXZ0Omluc3RhbmNlSUQ9InhtcC5paWQ6ZDlhMjJkMTEtZGUyOC00ZmJkLWI4M2UtN2U0NzU0ZmI0NzMxIgogICAgICBzdEV2dDpzb2Z0d2FyZUFnZW50PSJHaW1wIDIuMTAgKExpbnV4KSIKICAgICAgc3RFdnQ6d2hlbj0iMjAyMy0wOS0xN1QxNjowMDowMiswMzowMCIvPgogICAgPC9yZGY6U2VxPgogICA8L3htcE1NOkhpc3Rvcnk+CiAgPC9yZGY6RGVzY3JpcHRpb24+CiA8L3JkZjpSREY+CjwveDp4bXBtZXRhPgogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgIAogICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgCiAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAgICAKICAgICAgICAgICAgICAgICAgICAgICAgICAgCjw/eHBhY2tldCBlbmQ9InciPz7aLHOKAAAABmJLR0QA/wD/AP+gvaeTAAAACXBIWXMAAAPoAAAD6AG1e1JrAAAAB3RJTUUH5wkRDQACxPYhbgAABilJREFUaN7lWj2TG0UQfT0zK+msO53kKzBVQJEQOMEFFJASOSAkISDjx8C/cUBKQEBEEQABFIk/yuWyoXzG1t3p7vSxO00g7e7s7Mzu7EqysU7RqDW76u5502/29dI3333LuMIf1e108NG7RwAliDXhxeQCQkjs7/UgJDBjgkwYT569wPFktnsJmM3n+Pne31cXAbc/vQkAIMNIYIcNlo2XY/LN44pr0zss5zCbtnzA5jy2fndex4XrMrt1rXk/Op4+4DQY0/lsnAXombP63UxaPm91DZXvy5w7k409NjtRG7GtciDMteYSBhxZt+dwAQ/ZHHaMC9dTGTU+G62+bdS2Mgi/w2TBLCQp9pgKcGYj0TmScmc2YTO/1NmIAFEVYO0q1qDAvQ+p4IA9JgcKaItoEU1h7l1tbyKpGimGM/DA1GXbDILSLcDN9z4jICkhKIADBaG2tRFEaRE0HaYaFPgDZC9SwlGwDpwrEeRBgchWlANWsQXMS0ipQMG6ha4NWoQdIDtgvglahLOg5velV0SLIiTA7dFiec42Cl0VggQaBPg60iJqUCCaraKfFnkLtEgvgRaFkwFa0CK2QIt4CbQouHblX19aDEGQMAMsMMAO0GIIgkRdgLtOi60eh91IaVcvKmlxK+f/ok3U7n1ukhS0rhfBzwmBtBiKIAUGOIMHF57V03EcJzg5Oy8qRZbqA0s56nUiHPT3CgoQUZoUQxkCZal1/TcIIM6vYdNGhv7lsq1WPLVRdt/cptI/Yisz6USA8esfd8FJM7HxyfFzfP3FZ5nb/v8wkrIymEkhW0Viy19aJddloxzBThsA5Vod20mdaBwNDxsl4GRyYQmgKASIAgpQPa5CwTo24hwB9qqzCaGWknOOLj/MASBJNO78+Du6nah0D3LUDLuQaB3jy88/MCC+3NY2WlwIUunXHAUuJyk8aObSGaIO5os4gep08dYb16EiFfxfWi+jefj4aQ5tI/oQFKiCkxUFMf2cTS4RxzGEFIgihcv5AhzHkCrCcNC39PcaaBtbDgC0kbln4wmkFFBSYjZfoCs0ZgkghMDhQR9SuBfFVeiqbMqGvcthAEsnOhG63Qh7vQg6ScBCYrgfgbWGXi4rTsZj9K71M2j/9uf96oYKMz68+R50nGB8do43j4YAgEG/lyGqG/WgBGGPAc0aaezHJ2c47F/L+T2NwSp0PhsIOQLS3Z7CyK4F6f7srCD6YnIBCAGdJDg4OEBHLY8Uw9EoC1VKiU9uvW9RZ7npMp3NIZTE6HA/u7YTKUynl5jHGkkcQyoFZsbhQT7nxmhQlsI4nCoJcBXBYtEhTwEaDQdOCCZag4gKRdXmfZsWnb0uAL3eHnoVNSBJNEiQcw+EUqWCiwEctBj6kUI4mcA5XhmUkljMZ/jn+N/akutiBcnx0t8WtKjqixVh/U/16U9Kia9uf2ydMPPtEtpb9J/8/LSoyhxdpkUhBZ6PzxqFfH45zU9eDU9//q1IhYarq6jBaaugxQcXjwrd4VInmIAkSXB6OikVM3hWJ30W2O/3MmfDOszNutCcPUnWd5h9NuU7/Zm0qKTE9dHAcqyYBJfzRtfe5BnAi4L6euF7Tmhy/jdpUfgfb6kkioTL32GPw+yQz7Bt+cySxQQaBLiWZhAYYFN1KVT/98liIkgQZV9j1PVKy2ZetqjvQdgvW6zTGWoEc6rpFrcRUcO6SlyQz9qLqCZaHLI41aAgPMBmLfQGXSXHfZu2xQ1N0C52Fau4AZgzt0iKR0RFjYgaIqyKugDdsvj6Iiqq5PZNiqg1wqpovPd3jBaFH17htNiqhd6QFnlLtCiarWKDFvqGaREhLNOCFgU7Tn+boMUgh/8HtCjqT3y7TYuiKsCrQIvVL0peAVoUlTDfOC02e9niZdCiCH2jazO0iFdIi+4XK4Sriu4mLcKJAnXn+x9KsqfzO7ncRcC1HDSXCgYO86k09l/HrrYiA+ruwye4yh/V63Vx6+1DaC0gVQKhIixEBH1xifEMeGcQYZokeD6+wI1RH/GCMdXAeaIx6AiQkhggxtPzBWR3D8Mu8NNfj1+fBEynM/xy7ymkkOhIoKskxpfzbMJ9AyB3j093DgH/AUoFKSW6y1w4AAAAAElFTkSuQmCC')
     def compile_js(self,options=[]):
         js_script = '''
 /*General purpose functions*/
@@ -2362,11 +3198,12 @@ function sleep (time) {
 function extract_id() {
     return window.location.pathname.match(/\d+/)[0];
 }
-function ajaxHelperDestination(url,formElementById,destElementById) {
-/* wrap the callback to spill the response */
+function ajaxHelperDestination(url,formElementById,destElementById,spill) {
+/* wrap the callback to spill the response, or hand it to spill(response,tid) */
   let xhr = new XMLHttpRequest();
   target = document.getElementById(destElementById);
   let callspill = function(tid) {target = document.getElementById(tid);if(target){target.innerHTML = xhr.response+'<!-- updated -->';}}
+  if (spill) { callspill = function(tid) {spill(xhr.response,tid);} }
   xhr.open('PUT',url);
   xhr.onload = () => callspill(destElementById);
   if (formElementById === null || formElementById == 'null_form')
@@ -2380,6 +3217,41 @@ function ajaxHelperDestination(url,formElementById,destElementById) {
     }
   return xhr;
 }
+function ajaxGetDestination(url,destElementById) {
+/* read only requests go by GET so the browser revalidates its copy with the ETag */
+  let xhr = new XMLHttpRequest();
+  xhr.open('GET',url);
+  xhr.onload = () => {target = document.getElementById(destElementById);
+   if(target){target.innerHTML = xhr.response+'<!-- updated -->';}};
+  xhr.send();
+  return xhr;
+}
+function ajaxPatchDestination(url,formElementById,destElementById,fallbackUrl) {
+/* swap in place the fragments of the response by their id, a response without
+   fragments replaces destElementById, missing targets reload it from fallbackUrl */
+  let patchspill = function(response,tid) {
+    let holder = document.createElement('template');
+    holder.innerHTML = response;
+    let parts = holder.content.querySelectorAll('template[data-target]');
+    if (parts.length == 0) {
+     target = document.getElementById(tid);
+     if (target) {target.innerHTML = response+'<!-- updated -->';}
+     return;}
+    for (let p=0;p<parts.length;p++) {
+     if (!document.getElementById(parts[p].dataset.target)) {
+      console.log('DEBUG: Patch target missing',parts[p].dataset.target);
+      ajaxGetDestination(fallbackUrl,tid);
+      return;}
+    }
+    for (let p=0;p<parts.length;p++) {
+     let part = document.getElementById(parts[p].dataset.target);
+     if (parts[p].content.childNodes.length > 0) {part.replaceWith(parts[p].content);}
+     else { let branch = part.parentElement; part.remove();
+      if (branch && branch.tagName == 'UL' && branch.children.length == 0) {branch.remove();}}
+    }
+  }
+  return ajaxHelperDestination(url,formElementById,destElementById,patchspill);
+}
 /* Global function */
 function FMEA_Init(){
 /* These are not the droids you are looking for */
@@ -2438,7 +3310,7 @@ function reportView(sheet_id,report_name,report_type){
    target_url+='&opts='+option_target.value
   }
   if (report_type == 'preview'){
-   ajaxHelperDestination(target_url,'null_form',target_id);
+   ajaxGetDestination(target_url,target_id);
   } else {
    window.location.href = target_url;
   }
@@ -2470,7 +3342,7 @@ function treeCollapse(id,position) {
   if (current_call.includes(api_proposed_call)) {
    api_full_call = current_call.replace(api_proposed_call,'').replace('&&','&').replace('?&','?');
   } else { api_full_call = current_call+api_proposed_call; }
-  ajaxHelperDestination(api_endpoint+api_full_call,'null_form','tree');
+  ajaxGetDestination(api_endpoint+api_full_call,'tree');
   return false;
 }
 function treeActions(ignorea, ignoreb){
@@ -2560,10 +3432,10 @@ function leafPrepareMove(id) {
   return false;
 }
 function leafPerformDelete(formid){
-  /* send formdata via ajax, the result replaces the tree */
+  /* send formdata via ajax, the result removes the branch (or replaces the tree) */
   sheet_id = extract_id();
   ajax_endpoint = '/fmea/jsapi/'+sheet_id+'/leafdel';
-  ajaxHelperDestination(ajax_endpoint,formid,'tree');
+  ajaxPatchDestination(ajax_endpoint,formid,'tree','/fmea/jsapi/'+sheet_id+'/tree');
   target_toggle  = document.getElementById('hdr-right');
   if (target_toggle.innerHTML.includes('treeActions')) {
    applyClass('right-dlg','right-dlg-hidden');
@@ -2573,14 +3445,14 @@ function leafPerformDelete(formid){
   return false;
 }
 function leafPerformEdit(formid){
-  /* send formdata via ajax, the result replaces the tree */
+  /* send formdata via ajax, the result replaces the leaf (or the tree) */
   sheet_id = extract_id();
   ajax_endpoint = '/fmea/jsapi/'+sheet_id+'/leafupdate';
   /* HACK: Remove disabled from parentid
   target_parentid = document.getElementById('edit-in-parentid')
   target_parentid.removeAttribute('disabled');
   target_parentid.setAttribute('readonly','readonly'); */
-  ajaxHelperDestination(ajax_endpoint,formid,'tree');
+  ajaxPatchDestination(ajax_endpoint,formid,'tree','/fmea/jsapi/'+sheet_id+'/tree');
   target_toggle  = document.getElementById('hdr-right');
   if (target_toggle.innerHTML.includes('treeActions')) {
    applyClass('right-dlg','right-dlg-hidden');
@@ -2705,7 +3577,7 @@ function actionUpdate(formid,backToElement){
    } /* TODO: Implement the big list return */
    sleep(500).then(()=>{
     ajax_endpoint = '/fmea/jsapi/'+extract_id()+'/tree';
-    ajaxHelperDestination(ajax_endpoint,null,'tree');
+    ajaxGetDestination(ajax_endpoint,'tree');
    })
    return false;
 }
@@ -2742,18 +3614,164 @@ function navigateAndHighlight(id){
         else:
             return text
     def report_generate(self,id,name,type='preview',reop=['both'],debug=True):
+        # return a report of one sheet from the report cache, built when the sheet
+        # changed since (see report_build for the arguments), csv and excel share
+        # the same rows, callers must not change the report returned
+        cursor = self.get_db_connection()
+        key = self.report_key(cursor,id,name,type,reop)
+        cursor.connection.close()
+        report = self.report_cache_get(key)
+        if report is None:
+            report = self.report_build(id,name,type=type,reop=reop,debug=debug)
+            self.report_cache_put(key,report)
+        elif debug:
+            print(f'DEBUG: Report {name} of sheet {id} served from cache at revision {key[-1]}')
+        return report
+    def report_portfolio(self,name,type='csv',reop=['both'],debug=False):
+        # return one report over all sheets, each line led by the sheet id and title
+        # the sheets missing from the report cache are built by the report processes
+        cursor = self.get_db_connection()
+        sheets = self.get_sheets(cursor)
+        keys = list(self.report_key(cursor,sheet.id,name,type,reop) for sheet in sheets)
+        cursor.connection.close()
+        reports = list(self.report_cache_get(key) for key in keys)
+        missing = list(i for i,report in enumerate(reports) if report is None)
+        built = None
+        workers = self.app.config['REPORT_WORKERS'] or self.cpu_count() or 1
+        if len(missing) > 1 and workers > 1:
+            try:
+                built = list(self.get_report_pool().map(FMEA_App.report_worker,\
+                    list(sheets[i].id for i in missing),[name]*len(missing),\
+                    [type]*len(missing),[reop]*len(missing)))
+            except Exception as e:
+                print(f'ERROR: Report processes failed with {e.__class__.__name__} saying {e.args}')
+                self.close_report_pool(wait=False) # a broken pool cannot be joined
+                built = None
+        if built is None:
+            built = list(self.report_build(sheets[i].id,name,type=type,reop=reop,debug=debug)\
+                         for i in missing)
+        if debug: print(f'DEBUG: Built {len(missing)} of {len(sheets)} sheet reports')
+        for i,report in zip(missing,built):
+            reports[i] = report
+            self.report_cache_put(keys[i],report)
+        if len(reports) == 0:
+            return {'header': ['Sheet id','Sheet'],'lines':[]}
+        lines = []
+        for sheet,report in zip(sheets,reports):
+            lines.extend({'id':l['id'],'line':[sheet.id,sheet.title]+list(l['line'])}\
+                         for l in report['lines'])
+        return {'header':['Sheet id','Sheet']+list(reports[0]['header']),'lines':lines}
+    def get_report_pool(self):
+        # create once the processes building sheet reports, each with its own
+        # application and connections, configured like this one
+        with self.report_cache()['lock']:
+            pool = self.__dict__.get('_workers_',None)
+            if pool is None:
+                settings = dict((k,v) for k,v in self.app.config.items() if \
+                                isinstance(v,(str,int,float,bool,list,tuple,dict,type(None))))
+                pool = self.ProcessPoolExecutor(max_workers=self.app.config['REPORT_WORKERS']\
+                       or self.cpu_count(),initializer=FMEA_App.report_worker_init,\
+                       initargs=(settings,))
+                self._workers_ = pool
+                self.atexit.register(self.close_report_pool)
+        return pool
+    def close_report_pool(self,wait=True):
+        # stop the report processes
+        pool = self.__dict__.pop('_workers_',None)
+        if pool is not None:
+            pool.shutdown(wait=wait,cancel_futures=True)
+    @classmethod
+    def report_worker_init(cls,settings):
+        # runs once in every report process, nothing is shared with the parent
+        worker = cls()
+        worker.try_imports()
+        worker.get_config()
+        worker.app.config.update(settings)
+        cls._worker_ = worker
+    @classmethod
+    def report_worker(cls,id,name,type,reop):
+        # build one sheet report in a report process
+        return cls._worker_.report_build(id,name,type=type,reop=reop,debug=False)
+    def report_key(self,cursor,id,name,type='preview',reop=['both']):
+        # the report cache key of a sheet report, csv and excel share the same rows
+        # the aadc class lines read the actions of all sheets
+        return (self.app.config['db_file'],str(id),name,'preview' if type == 'preview'\
+                else 'full',tuple(reop) if name == 'aadc' else (),\
+                self.get_sheet_revision(cursor,id,actions=name == 'aadc'))
+    def report_cache(self):
+        # the cached reports by key, the least recently used first
+        cache = self.__dict__.get('_reports_',None)
+        if cache is None:
+            cache = {'entries': dict(), 'lines': 0, 'lock': self.threading.Lock()}
+            self._reports_ = cache
+        return cache
+    def report_cache_get(self,key):
+        # return the cached report of key and mark it as recently used
+        cache = self.report_cache()
+        with cache['lock']:
+            report = cache['entries'].pop(key,None)
+            if report is not None:
+                cache['entries'][key] = report
+        return report
+    def report_cache_put(self,key,report):
+        # keep a report, drop the reports of older revisions of the same sheet and
+        # the least recently used ones while over the entry or line limits
+        cache = self.report_cache()
+        size = len(report['lines'])
+        if key[-1] is None or size > self.app.config['REPORT_CACHE_LINES']:
+            return False # no revision to check the report against, or too large
+        with cache['lock']:
+            entries = cache['entries']
+            # older revisions of the sheet, or of the same report when only actions changed
+            stale = list(k for k in entries if k[:2] == key[:2] and (k[-1][:2] != key[-1][:2]\
+                         or (k[:-1] == key[:-1] and k[-1] != key[-1])))
+            if key in entries:
+                stale.append(key)
+            for k in stale:
+                cache['lines'] -= len(entries.pop(k)['lines'])
+            entries[key] = report
+            cache['lines'] += size
+            while len(entries) > self.app.config['REPORT_CACHE_ENTRIES'] or\
+                  cache['lines'] > self.app.config['REPORT_CACHE_LINES']:
+                cache['lines'] -= len(entries.pop(next(iter(entries)))['lines'])
+        return True
+    def report_build(self,id,name,type='preview',reop=['both'],debug=True,lazy=True):
         # generate reports from data in one sheet
         # id is the sheet id
         # name can be 'afc', 'fmbrl' or 'aadc'
         # type can be 'preview', 'csv','excel'
-        cursor = self.get_db_connection()
-        tree = self.get_sheet_tree(cursor,id)
-        actions = self.get_action_list(cursor,tree)
-        domain = self.get_domain_list(cursor)
-        cursor.connection.close()
+        # the lines come from the row generators (iter_*_lines), a preview takes only
+        # the first ones and reads the sheet lazily as far as those need it, up to
+        # PREVIEW_LAZY_LEAFS leafs, past them the preview is built again from the
+        # sheet loaded in bulk (lazy=False)
+        report = self.report_rows(id,name,type=type,reop=reop,debug=debug,lazy=lazy)
+        report['lines'] = list(report['lines'])
+        if report.pop('exceeded',False):
+            if debug: print(f'DEBUG: Preview {name} of sheet {id} loads the sheet in bulk')
+            return self.report_build(id,name,type=type,reop=reop,debug=debug,lazy=False)
+        return report
+    def report_rows(self,id,name,type='preview',reop=['both'],debug=True,lazy=True):
+        # return the header of a report and its lines as a generator (see report_build
+        # for the arguments), the generator holds the connection and the sheet reads
+        # until it ends or is closed, when a lazy preview stopped short of the sheet
+        # it sets 'exceeded' in the report
         fc_range = self.app.config['MAX_TREE_DEPTH']+1
         re_range = self.app.config['PREVIEW_LINES']
-        ld_range = self.app.config['MAX_CHARS_DESCRIPTION']
+        cursor = self.get_db_connection()
+        domain = self.get_domain_list(cursor)
+        root = FMEA_Function().__nodeinband__({'id':id})
+        lazy = lazy and type == 'preview' and \
+               root.__sqliteself__(cursor,'parentid IS NULL') is not None
+        opened = [] # lazy reads, stopped before the connection goes back to the pool
+        if lazy:
+            reader = self.iter_sheet_tree(cursor,id)
+            opened.append(reader)
+            tree = self.islice(reader,self.app.config['PREVIEW_LAZY_LEAFS'])
+        else:
+            tree = self.get_sheet_tree(cursor,id)
+            actions = self.get_action_list(cursor,tree)
+            root = list(filter(lambda x:x.parentid is None,tree))[0]
+        report_lines = None
         if name == 'afc':
             # actions by failure cause
             report_header = ['Function']
@@ -2772,90 +3790,18 @@ function navigateAndHighlight(id){
                 report_header.append(at)
             report_header.append('Action category not clasified')
             if debug: print(f'DEBUG: generated header as {report_header}')
-            tree_selection = []
-            act_parents = []
-            for act in actions:
-                this_parents = list(set(act.parentlist.split(',')))
-                act_parents.append({'id':act.id,'title':act.title,\
-                 'category':act.category,'parents':this_parents})
-                tree_selection.extend(this_parents)
-            tree_selection = sorted(set(tree_selection))
-            if debug: print(f'Tree selection {tree_selection}')
-            if debug: print(f'Actions with parents {act_parents}')
-            failure_cause_list = []
-            tree = tree[0].__treesort__(tree)
-            for le in tree:
-                # we are forced to recalculate path here
-                if le.parentid is None: continue
-                text_path = []
-                if le.parentid != id and le.parentid is not None:
-                    if len(failure_cause_list)>0:
-                        self_fcl = list(filter(lambda x:x['id']==le.parentid,\
-                                                        failure_cause_list))
-                        if len(self_fcl)>0:
-                            text_path.extend(self_fcl[0]['text_path'])
-                text_path.append(le.title)
-                failure_cause_list.append({'id':le.id,'title':le.title,\
-                 'text_path': text_path, 'means_of_identification':\
-                 le.means_of_identification if le.__contains__('means_of_identification')\
-                 else '', 'risk': le.risk_level if le.__contains__('risk_level') else '',\
-                 'description': le.description if le.__contains__('decription') else ''})
-            if debug: print(f'Failures are {failure_cause_list}')
-            fc_with_act = list(reversed(list(filter(lambda x:str(x['id']) in tree_selection,\
-                failure_cause_list))))
-            report_depth = 1
-            if debug: print(f'Failure causes with actions {fc_with_act}')
-            if type == 'preview':
-                report_depth = 0-re_range
-            report_line = []
-            while len(fc_with_act)>0 and report_depth != 0:
-                report_depth +=1
-                record = fc_with_act.pop()
-                if debug: print(f'DEBUG: Popped record {record}')
-                report_line.append({'id':record['id'],'line': record['text_path'].copy()})
-                report_cr = len(report_line)-1
-                if debug: print(f'DEBUG: Working on report line {report_cr}')
-                for i in range(fc_range-len(report_line[report_cr]['line'])+1):
-                    report_line[report_cr]['line'].append('')
-                if debug: print(f'Appending means {record["means_of_identification"]} and risk {record["risk"]}')
-                if type == 'preview' and len(record['description']) > ld_range:
-                    report_line[report_cr]['line'].append(record['description'][:ld_range]+'...')
-                else:
-                    report_line[report_cr]['line'].append(record['description'])
-                report_line[report_cr]['line'].append(record['means_of_identification'])
-                report_line[report_cr]['line'].append(record['risk'])
-                to_reintroduce = False
-                if debug: print(f'DEBUG: We have {len(action_types)} categories as: {action_types}')
-                for category in action_types:
-                    acts = list(filter(lambda x:str(record['id']) in x['parents'] and \
-                     f'Action category {x["category"].lower()}' == category,act_parents))
-                    if debug: print(f'DEBUG: Filtered acts by {category} and {record["id"]} - {acts}')
-                    if len(acts) == 0:
-                        report_line[report_cr]['line'].append('')
-                    else:
-                        report_line[report_cr]['line'].append(acts[0]['title'])
-                        act_parents[act_parents.index(acts[0])]['parents'].\
-                            remove(str(record['id']))
-                        if debug: print(f'DEBUG: New parents {acts[0]["parents"]}')
-                        if len(acts)>1:
-                            to_reintroduce = True
-                acts = list(filter(lambda x:record['id'] in x['parents'] and \
-                     f'Action category {x["category"]}' not in action_types,act_parents))
-                if debug: print(f'DEBUG: Report line looks like {report_line[report_cr]["line"]}')
-                if len(acts) == 0:
-                    report_line[report_cr]['line'].append('')
-                else:
-                    report_line[report_cr]['line'].append(acts[0]['title'])
-                    act_parents.remove(acts[0])
-                    if len(acts)>1:
-                        to_reintroduce = True
-                if to_reintroduce:
-                    fc_with_act.append(record)
-            return {'header':report_header,'lines':report_line}
+            if lazy:
+                # the actions of one failure cause through the link table index
+                actions_of = lambda key:list(filter(lambda x:x.parentlist is not None,\
+                    self.get_leaf_actions(cursor,FMEA_Failure_Mode().__nodeinband__({'id':key}))))
+            else:
+                # the shared index gives the actions of a parent in list order
+                by_parent = dict((str(p),acts) for p,acts in \
+                                 FMEA_Action().__mtmindex__(actions).items())
+                if debug: print(f'DEBUG: Tree selection has {len(by_parent)} parents')
+                actions_of = lambda key:by_parent.get(key,[])
+            report_lines = self.iter_afc_lines(tree,actions_of,action_types,type)
         if name == 'fmbrl':
-            sheets = list(filter(lambda x:x.parentid is None,tree))
-            failure_modes = list(filter(lambda x:x.__class__.__name__ == \
-             FMEA_Failure_Mode.__name__,tree))
             report_header = ['Risk level','Discipline']
             for i in range(fc_range):
                 if i == 0:
@@ -2863,27 +3809,8 @@ function navigateAndHighlight(id){
                 else:
                     report_header.append(f'Failure cause {i}')
             report_header.append('Description')
-            tree[0].__treesort__(tree)
-            report_line = []
-            report_cr = 0
-            for fm in failure_modes:
-                report_line.append({'id':fm.id,'line':[fm['risk_level'],\
-                    fm['discipline']]})
-                if report_cr > 0:
-                    for i in range(len(fm._path_)-3):
-                        report_line[report_cr]['line'].append(\
-                         report_line[report_cr-1]['line'][i+2])
-                report_line[report_cr]['line'].append(fm.title)
-                for i in range(fc_range-len(report_line[report_cr]['line'])+2):
-                    report_line[report_cr]['line'].append('')
-                if type == 'preview' and len(fm.description) > ld_range:
-                    report_line[report_cr]['line'].append(fm.description[:ld_range]+'...')
-                else:
-                    report_line[report_cr]['line'].append(fm.description)
-                report_cr+=1
-                if type == 'preview' and report_cr > re_range:
-                    break # that's enough
-            return {'header':report_header,'lines':report_line}
+            report_lines = self.iter_fmbrl_lines(tree,type)
+            re_range += 1 # the preview always showed one line more
         if name == 'aadc':
             # actions at different criticality
             # has two coordinates:
@@ -2891,85 +3818,303 @@ function navigateAndHighlight(id){
             # 2. for action template equipment if it's not null
             report_header = ['Equipment Type','Equipment','Equipment tag','Criticality',\
                 'Failure risk','Action','Frequency','Description']
-            current_eqptty = 'Equipment level'
-            sheets = list(filter(lambda x:x.parentid is None,tree))
-            current_eqpttn = sheets[0].asset_description
-            current_eqpttg = sheets[0].asset_name
-            current_eqpttc = sheets[0].asset_criticality
-            current_fmeari = ''
-            failure_modes = list(filter(lambda x:x.__class__.__name__ == \
-             FMEA_Failure_Mode.__name__,tree))
-            tree_selection = []
-            act_parents = []
-            for act in actions:
-                this_parents = list(filter(lambda y:y is not None,list(set(map(\
-                 lambda  x:int(x.strip()) if x.strip().isnumeric() else None,\
-                 act.parentlist.split(','))))))
-                tree_selection.extend(this_parents)
-            tree_selection = sorted(set(tree_selection))
-            failure_modes = list(filter(lambda x:x.id in tree_selection,failure_modes))
-            report_line = []
-            act_risk = []
-            report_cr = 0
-            waiting_actions = actions.copy()
-            while len(waiting_actions) > 0 and (report_cr < re_range or type !=\
-             'preview') and ('equipment level' in reop or 'both' in reop):
-                if len(act_risk) == 0:
-                    act = waiting_actions.pop()
-                    apl = list(filter(lambda y:y is not None,list(map(lambda \
-                     x:int(x.strip()) if x.strip().isnumeric() else None,\
-                     act.parentlist.split(',')))))
-                    act_risk = list(set(map(lambda x:x.risk_level,list(filter(\
-                     lambda y:y.id in apl,failure_modes)))))
-                if len(act_risk) == 0:
-                    continue
-                current_fmeari = act_risk.pop()
-                report_line.append({'id':act.id,'line':[current_eqptty,current_eqpttn,\
-                 current_eqpttg,current_eqpttc,current_fmeari,act.title]})
-                if current_eqpttc.lower() in ['a','b','c','d']:
-                    report_line[report_cr]['line'].append(\
-                     act[f'frequency_for_{current_eqpttc.upper()}_criticality'])
+            if lazy:
+                equipment = self.iter_sheet_action_risks(cursor,id)
+                classes = FMEA_Action().__sqliteiter__(cursor,'parentlist IS NOT NULL',\
+                                                      limit=re_range)
+                opened.extend([equipment,classes])
+                report_lines = self.iter_aadc_lines(root,equipment,classes,reop,type)
+            else:
+                report_lines = self.iter_aadc_table(root,tree,actions,reop,type)
+        if report_lines is None:
+            cursor.connection.close()
+            return {'header': ['Not Implemented'],'lines':[{'id':0,'line':['-']}]}
+        opened.insert(0,report_lines)
+        report = {'header':report_header}
+        def lines(report_lines=report_lines):
+            count = 0
+            try:
+                if type == 'preview':
+                    report_lines = self.islice(report_lines,re_range)
+                for line in report_lines:
+                    count += 1
+                    yield line
+                # a short preview whose leafs ran out at the limit while the sheet goes on
+                report['exceeded'] = lazy and count < re_range and next(tree,None) is None\
+                                     and next(reader,None) is not None
+            finally:
+                for opened_reader in opened:
+                    opened_reader.close()
+                cursor.connection.close()
+        report['lines'] = lines()
+        return report
+    def iter_afc_lines(self,tree,actions_of,action_types,type='preview'):
+        # yield the lines of the actions by failure cause report, tree gives the leafs
+        # in pre-order and actions_of(id) the actions of one leaf in list order
+        fc_range = self.app.config['MAX_TREE_DEPTH']+1
+        ld_range = self.app.config['MAX_CHARS_DESCRIPTION']
+        paths = dict()
+        by_parent = dict()
+        removed = set() # actions listed as not clasified leave every other column
+        listed = dict() # what is left to list by failure cause id
+        for le in tree:
+            if le.parentid is None: continue
+            text_path = []
+            if le.parentid in paths:
+                text_path.extend(paths[le.parentid])
+            text_path.append(le.title)
+            paths.setdefault(le.id,text_path)
+            record = {'id':le.id,'title':le.title,\
+             'text_path': text_path, 'means_of_identification':\
+             le.means_of_identification if le.__contains__('means_of_identification')\
+             else '', 'risk': le.risk_level if le.__contains__('risk_level') else '',\
+             'description': le.description if le.__contains__('decription') else ''}
+            if str(record['id']) not in by_parent:
+                by_parent[str(record['id'])] = actions_of(str(record['id']))
+            if len(by_parent[str(record['id'])]) == 0:
+                continue
+            if str(record['id']) not in listed:
+                # the actions of the failure cause stacked by column (next one last),
+                # a cause with several actions in one column gets one line per action
+                stacks = dict()
+                for act in reversed(by_parent[str(record['id'])]):
+                    stacks.setdefault(f'Action category {act.category.lower()}',[]).append(act)
+                # as before the not clasified column compares the raw id with the parents
+                others = list(filter(lambda x:f'Action category {x.category}' not in \
+                              action_types,reversed(by_parent.get(record['id'],[]))))
+                listed[str(record['id'])] = (stacks,others,set())
+            stacks,others,taken = listed[str(record['id'])]
+            again = True
+            while again:
+                again = False
+                line = record['text_path'].copy()
+                line.extend(['']*(fc_range-len(line)+1))
+                if type == 'preview' and len(record['description']) > ld_range:
+                    line.append(record['description'][:ld_range]+'...')
                 else:
-                    report_line[report_cr]['line'].append('-')
-                if type == 'preview' and len(act['description']) > ld_range:
-                    report_line[report_cr]['line'].append(act['description'][:ld_range]+'...')
+                    line.append(record['description'])
+                line.append(record['means_of_identification'])
+                line.append(record['risk'])
+                for category in action_types:
+                    stack = stacks.get(category,[])
+                    while len(stack) > 0 and stack[-1] in removed:
+                        stack.pop()
+                    if len(stack) == 0:
+                        line.append('')
+                        continue
+                    act = stack.pop()
+                    taken.add(act)
+                    line.append(act.title)
+                    while len(stack) > 0 and stack[-1] in removed:
+                        stack.pop()
+                    again = again or len(stack) > 0
+                while len(others) > 0 and (others[-1] in removed or others[-1] in taken):
+                    others.pop()
+                if len(others) == 0:
+                    line.append('')
                 else:
-                    report_line[report_cr]['line'].append(act['description'])
-                report_cr += 1
-            if (report_cr < re_range or type != 'preview') and ('class level' in\
-             reop or 'both' in reop):
-                current_eqptty = 'Class level'
-                for act in actions:
-                    current_eqpttn = act.templating_equipment
-                    current_eqpttg = act.templating_group
-                    for current_eqpttc in ['a','b','c','d']:
-                        report_line.append({'id':act.id,'line':[current_eqptty,\
-                         current_eqpttn,current_eqpttg,current_eqpttc,1,act.title,\
-                         act[f'frequency_for_{current_eqpttc.upper()}_criticality']]})
-                        if type == 'preview' and len(act['description']) > ld_range:
-                            # TODO: The max description len for preview -> setting
-                            report_line[report_cr]['line'].append(act['description']\
-                             [:ld_range]+'...')
-                        else:
-                            report_line[report_cr]['line'].append(act['description'])
-                        report_cr += 1
-                        if report_cr >= re_range and type == 'preview': break
-                    if report_cr >= re_range and type == 'preview': break
-            return {'header':report_header,'lines':report_line}
-        return {'header': ['Not Implemented'],'lines':[{'id':0,'line':['-']}]}
+                    act = others.pop()
+                    removed.add(act)
+                    line.append(act.title)
+                    while len(others) > 0 and (others[-1] in removed or others[-1] in taken):
+                        others.pop()
+                    again = again or len(others) > 0
+                yield {'id':record['id'],'line':line}
+    def iter_fmbrl_lines(self,tree,type='preview'):
+        # yield the lines of the failure mode by risk level report, tree gives the
+        # leafs in pre-order with their paths
+        fc_range = self.app.config['MAX_TREE_DEPTH']+1
+        ld_range = self.app.config['MAX_CHARS_DESCRIPTION']
+        previous = None
+        for fm in tree:
+            if fm.__class__.__name__ != FMEA_Failure_Mode.__name__:
+                continue
+            line = [fm['risk_level'],fm['discipline']]
+            if previous is not None:
+                for i in range(len(fm._path_)-3):
+                    line.append(previous[i+2])
+            line.append(fm.title)
+            line.extend(['']*(fc_range-len(line)+2))
+            if type == 'preview' and len(fm.description) > ld_range:
+                line.append(fm.description[:ld_range]+'...')
+            else:
+                line.append(fm.description)
+            previous = line
+            yield {'id':fm.id,'line':line}
+    def iter_aadc_lines(self,sheet,equipment,classes,reop=['both'],type='preview'):
+        # yield the lines of the actions at different criticality report, equipment
+        # gives (action, risk levels in the sheet) from the last action to the first
+        # and classes the actions in list order
+        ld_range = self.app.config['MAX_CHARS_DESCRIPTION']
+        describe = lambda act:act['description'][:ld_range]+'...' if type == 'preview' and \
+                              len(act['description']) > ld_range else act['description']
+        if 'equipment level' in reop or 'both' in reop:
+            current_eqpttc = sheet.asset_criticality
+            waiting = iter(equipment)
+            following = next(waiting,None)
+            while following is not None:
+                act,act_risk = following
+                following = next(waiting,None)
+                while len(act_risk) > 0:
+                    line = ['Equipment level',sheet.asset_description,sheet.asset_name,\
+                            current_eqpttc,act_risk.pop(),act.title]
+                    if current_eqpttc.lower() in ['a','b','c','d']:
+                        line.append(act[f'frequency_for_{current_eqpttc.upper()}_criticality'])
+                    else:
+                        line.append('-')
+                    line.append(describe(act))
+                    yield {'id':act.id,'line':line}
+                    if following is None:
+                        break # the last action always gave a single line
+        if 'class level' in reop or 'both' in reop:
+            for act in classes:
+                for current_eqpttc in ['a','b','c','d']:
+                    yield {'id':act.id,'line':['Class level',act.templating_equipment,\
+                     act.templating_group,current_eqpttc,1,act.title,\
+                     act[f'frequency_for_{current_eqpttc.upper()}_criticality'],describe(act)]}
+    def iter_aadc_table(self,sheet,tree,actions,reop=['both'],type='preview'):
+        # yield the same lines as iter_aadc_lines for a loaded sheet, computed on whole
+        # columns: one join of the action links with the failure modes of the tree
+        # gives the risk levels of every action, one reshape the class level lines
+        ld_range = self.app.config['MAX_CHARS_DESCRIPTION']
+        pd = self.pd
+        frequencies = list(f'frequency_for_{c}_criticality' for c in ['A','B','C','D'])
+        acts = pd.DataFrame(list([act.id,act.title,act.description,act.templating_equipment,\
+                act.templating_group]+list(act[f] for f in frequencies) for act in actions),\
+                columns=['id','title','description','equipment','group']+frequencies,dtype=object)
+        if type == 'preview':
+            acts['description'] = acts['description'].map(lambda x:x[:ld_range]+'...' \
+                                                          if len(x) > ld_range else x)
+        if len(acts) == 0:
+            return
+        failure_modes = list((order,leaf.id,leaf.risk_level) for order,leaf in enumerate(tree)\
+                             if leaf.__class__.__name__ == FMEA_Failure_Mode.__name__)
+        if ('equipment level' in reop or 'both' in reop) and len(failure_modes) > 0:
+            links = pd.DataFrame(list((pos,p) for pos,act in enumerate(actions)\
+                                      for p in act.__mtmparentids__()),columns=['pos','parentid'])
+            failure_modes = pd.DataFrame(failure_modes,columns=['order','parentid','risk'])
+            failure_modes['risk'] = failure_modes['risk'].astype(object)
+            # the risk levels of each action in tree order, from the last action to the first
+            joined = links.merge(failure_modes,on='parentid').sort_values(['pos','order'],\
+                     ascending=[False,True],kind='stable')
+            positions = []
+            act_risks = []
+            for pos,risks in joined.groupby('pos',sort=False)['risk']:
+                risks = sorted(set(risks.tolist()),key=str) # as iter_sheet_action_risks
+                if pos == 0:
+                    risks = risks[-1:] # the last action always gave a single line
+                positions.extend([pos]*len(risks))
+                act_risks.extend(reversed(risks))
+            criticality = sheet.asset_criticality
+            lines = acts.iloc[positions]
+            if criticality.lower() in ['a','b','c','d']:
+                frequency = lines[f'frequency_for_{criticality.upper()}_criticality'].tolist()
+            else:
+                frequency = ['-']*len(lines)
+            for act_id,risk,title,freq,description in zip(lines['id'].tolist(),act_risks,\
+                    lines['title'].tolist(),frequency,lines['description'].tolist()):
+                yield {'id':act_id,'line':['Equipment level',sheet.asset_description,\
+                       sheet.asset_name,criticality,risk,title,freq,description]}
+        if 'class level' in reop or 'both' in reop:
+            # every action repeated for the four criticalities, row by row the frequency
+            # columns give the frequency of each
+            lines = acts.loc[acts.index.repeat(4)]
+            frequency = acts[frequencies].to_numpy().reshape(-1).tolist()
+            for act_id,equipment,group,criticality,title,freq,description in zip(\
+                    lines['id'].tolist(),lines['equipment'].tolist(),lines['group'].tolist(),\
+                    ['a','b','c','d']*len(acts),lines['title'].tolist(),frequency,\
+                    lines['description'].tolist()):
+                yield {'id':act_id,'line':['Class level',equipment,group,criticality,1,\
+                       title,freq,description]}
     def derive_report(self,report):
         # represent html of a report (or report preview) having header and lines
-        report_html = ''
-        for h in report['header']:
-            report_html = f'{report_html}<th>{h}&nbsp;</th>'
-        report_html = f'<tr>{report_html}</tr>'
+        return ''.join(self.iter_report(report))
+    def iter_report(self,report):
+        # yield the report table line by line
+        yield '<table><tr>'
+        yield ''.join(f'<th>{h}&nbsp;</th>' for h in report['header'])
+        yield '</tr>'
         for l in report['lines']:
-            line_html = ''
-            for f in l['line']:
-                line_html = f'{line_html}<td>{f}&nbsp;</td>'
+            line_html = ''.join(f'<td>{f}&nbsp;</td>' for f in l['line'])
             if len(line_html)>0:
-                report_html = f'{report_html}<tr>{line_html}</tr>'
-        return f'<table>{report_html}</table>'
+                yield f'<tr>{line_html}</tr>'
+        yield '</table>'
+    def iter_report_csv(self,report):
+        # yield the report as csv text line by line, each line is led by its row number
+        # and padded to the header width like the former pandas export
+        buffer = self.StringIO()
+        writer = self.csv.writer(buffer,lineterminator='\n')
+        width = len(report['header'])
+        writer.writerow(['']+list(report['header']))
+        lines = iter(report['lines'])
+        try:
+            for i,l in enumerate(lines):
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow([i]+list(l['line'])+['']*(width-len(l['line'])))
+            yield buffer.getvalue()
+        finally:
+            if hasattr(lines,'close'):
+                lines.close() # a stream stopped early gives back the connection of the rows
+    def report_xlsx(self,report,title='Report'):
+        # write the report into a write-only workbook, rows are streamed into the
+        # sheet as they come and the file is kept in a spooled buffer (memory first)
+        xl = self.openpyxl
+        wb = xl.Workbook(write_only=True)
+        ws = wb.create_sheet(title=str(title)[:31])
+        ws.freeze_panes = 'A2'
+        bold = xl.styles.Font(bold=True)
+        fill = xl.styles.PatternFill(fill_type='solid',start_color='FFD9D9D9')
+        header = []
+        for h in ['']+list(report['header']):
+            cell = xl.cell.WriteOnlyCell(ws,value=h)
+            cell.font = bold
+            cell.fill = fill
+            header.append(cell)
+        ws.append(header)
+        # only the id and risk level columns hold numbers stored as text, any other
+        # text is kept as it is (tags and titles like "0012" keep their zeros)
+        numeric = set(i for i,h in enumerate(report['header']) if h in self.report_numeric)
+        for i,l in enumerate(report['lines']):
+            ws.append([i]+list(int(v) if c in numeric and isinstance(v,str) and v.isdecimal()\
+                               else v for c,v in enumerate(l['line'])))
+        buffer = self.SpooledTemporaryFile(max_size=self.app.config['REPORT_SPOOL_SIZE'])
+        wb.save(buffer)
+        buffer.seek(0)
+        return buffer
+    def report_filename(self,cursor,id,name,extension):
+        # name a report download after its sheet title
+        root = FMEA_Function().__nodeinband__({'id':id})
+        if root.__sqliteself__(cursor) is None:
+            return f'{name}.{extension}'
+        return f'{self.util_clean_name(root.title)}_{name}.{extension}'
+    def iter_edit(self,id,tree,actions,domain,dialog_class='right-dlg-hidden',formdata=''):
+        # yield the editor page content, the tree and the action list as they render
+        yield '''<div id="editor" class="editor" onscroll="scrollSync()">
+            <div id="tree" class="tree">'''
+        yield from self.iter_tree(tree,domain=domain,actions=actions)
+        yield f'''</div>      </div>
+            <div id="right-dlg" class="{dialog_class}">
+             <div id="right-dlg-hdr" class="right-dlg-hdr">
+              <div id="right-dlg-hdr-filler">&nbsp;</div>
+              <!-- <a class="right-dlg-hdr-a" href="#" onclick="toggleBetweenClasses('act-legend','act-legend-h','act-legend');return false">
+              Legend</a>&nbsp;-->
+              <a class="right-dlg-hdr-a" href="#" onclick="applyClass('right-dlg',
+               'right-dlg-hidden');ajaxGetDestination('/fmea/jsapi/{id}/tree','tree');return false">Hide</a>&nbsp;
+             </div>
+             <div id="right-dlg-content" class="right-dlg-content">
+             <div id="right-dlg-pretty-bottom" class="right-dlg-ftr">&nbsp;<br/></div>
+              {self.derive_action_legend(domain)}
+              <h3>Action List</h3><br/>
+              '''
+        yield from self.iter_action_list(actions,domain,tree)
+        yield f'''
+              {formdata}
+           <!-- TODO: Add content for all dialogs, hide contents using class -->
+            <!-- </div> -->
+            </div>
+           </div>'''
     def util_new_node(self,cursor):
         max_func_id = FMEA_Function().__sqlitenextid__(cursor)
         max_fmea_id = FMEA_Failure_Mode().__sqlitenextid__(cursor)
@@ -3004,7 +4149,6 @@ function navigateAndHighlight(id){
                 cursor.connection.close()
                 return self.redir('/fmea',code=302)
             if apitype == 'uploadsheet':
-                filename = ''
                 try:
                     if (self.request.method in ['POST','PUT'] and \
                      'sheetfile' in self.request.files):
@@ -3012,15 +4156,13 @@ function navigateAndHighlight(id){
                         if debug: print(f'DEBUG: Found {file}')
                         if (len(file.filename)>1 and (file.filename.find('.sqlite3')\
                          or file.filename.find('.fmea') or file.filename.find('.fmeasheet'))):
-                            if not self.path.exists(self.app.config['template_folder']):
-                                self.mkdir(self.app.config['template_folder'])
-                            filename = self.path.join(self.app.config["template_folder"],\
-                             f'{file.filename.split(".")[0]}_save.sqlite3')
-                            while self.path.exists(filename):
-                                # TODO: Find a cleaner way to ensure correct unique document
-                                filename = filename.replace('.fmea','_.fmea')
-                            file.save(filename)
-                            newtree = self.import_from_file(filename,cursor,self.sqlite3)
+                            # the upload stays in memory (see MemoryRequest), capped in size
+                            data = file.stream.read(self.app.config['UPLOAD_MAX_BYTES']+1)
+                            if len(data) > self.app.config['UPLOAD_MAX_BYTES']:
+                                raise Exception('sheetFileTooLarge')
+                            newtree = self.import_from_bytes(data,cursor)
+                            if newtree is None:
+                                raise Exception('sheetFileInvalid')
                             if len(newtree) == 0:
                                 raise Exception('sheetFileEmpty')
                                 #return self.redir('/fmea?importError=sheetFileEmpty')
@@ -3034,58 +4176,74 @@ function navigateAndHighlight(id){
                     else:
                         raise Exception('invalidUseOfForm')
                 except Exception as e:
+                    # a refused upload (RequestEntityTooLarge) comes without args
+                    message = str(e.args[0]) if len(e.args) > 0 else 'sheetFileTooLarge'
                     return self.redir(\
-                     f'/fmea?importError={e.__class__.__name__}&message={str(e.args[0])}',\
+                     f'/fmea?importError={e.__class__.__name__}&message={message}',\
                      code=302)
                 finally:
-                    # TODO: Delete the files
                     cursor.connection.close()
-                    try:
-                        self.rmfile(filename)
-                    except Exception as e:
-                        print(f'ERROR: Unable to delete {filename} saying {e._class__.__name__}-{e.args}')
             if apitype == 'downloadsheet':
-                # here id is the sheet_id we want to download
-                tree = self.get_sheet_tree(cursor,id)
-                actions = self.get_action_list(cursor,tree)
-                if not self.path.exists(self.app.config['template_folder']):
-                    self.mkdir(self.app.config['template_folder'])
-                filename = self.path.join(self.app.config['template_folder'],\
-                 f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["title"])}.fmea')
-                while self.path.exists(filename):
-                    # TODO: Find a cleaner way to ensure correct unique filename
-                    filename = filename.replace('.fmea','_.fmea')
-                self.export_to_file(tree,actions,filename,cursor,self.sqlite3)
+                # here id is the sheet_id we want to download, built in memory
+                self.check_schema(cursor,[FMEA_Function(),FMEA_Failure_Mode(),FMEA_Action()])
+                root = FMEA_Function().__nodeinband__({'id':id})
+                if root.__sqliteself__(cursor) is None:
+                    tree = self.get_sheet_tree(cursor,id) # creates the missing sheet
+                    root = list(filter(lambda x:x.parentid is None, tree))[0]
+                title = root.title
                 cursor.connection.close()
-                return self.send_file(filename,mimetype="application/octet-stream",\
-                 as_attachment=True)
+                data = self.export_to_bytes(id)
+                if data is None:
+                    return self.redir(f'/fmea/edit/{id}/apidefault',code=302)
+                headers = {'Content-Disposition':\
+                           f'attachment; filename="{self.util_clean_name(title)}.fmea"',\
+                           'Vary': 'Accept-Encoding'}
+                if self.app.config['EXPORT_GZIP'] and 'gzip' in self.request.accept_encodings:
+                    data = self.gzip_compress(data)
+                    headers['Content-Encoding'] = 'gzip'
+                return self.app.response_class(data,mimetype='application/octet-stream',\
+                                               headers=headers)
             if apitype == 'report':
                 # here id is the shee_id and args come in args
                 report_name = self.request.args.get('name','afc')
                 report_type = self.request.args.get('type','preview')
                 report_opts = self.request.args.get('opts','both')
+                if report_type == 'csv':
+                    # written row by row into the response as the row generator gives
+                    # them, the report holds its connection until the stream ends and
+                    # is not kept in the report cache, no file and no DataFrame
+                    filename = self.report_filename(cursor,id,report_name,'csv')
+                    cursor.connection.close()
+                    report_data = self.report_rows(id,report_name,type=report_type,\
+                     reop=[report_opts])
+                    return self.stream_page(self.iter_report_csv(report_data),mimetype='text/csv',\
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
                 report_data = self.report_generate(id,report_name,type=report_type,\
                  reop=[report_opts])
-                if report_type == 'csv' or report_type == 'excel':
-                    df = self.pd.DataFrame(data=list(l['line'] for l in \
-                        report_data['lines']),columns=report_data['header'])
-                    tree = self.get_sheet_tree(cursor,id)
-                    if not self.path.exists(self.app.config['template_folder']):
-                        self.mkdir(self.app.config['template_folder'])
-                    if report_type == 'csv':
-                        filename = self.path.join(self.app.config['template_folder'],\
-f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["title"])}_{report_name}.csv')
-                        df.to_csv(filename)
-                    else:
-                        filename = self.path.join(self.app.config['template_folder'],\
-f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["title"])}_{report_name}.xlsx')
-                        df.to_excel(filename)
+                if report_type == 'excel':
+                    filename = self.report_filename(cursor,id,report_name,'xlsx')
                     cursor.connection.close()
-                    return self.send_file(filename,mimetype="text/csv",\
-                 as_attachment=True)
+                    return self.send_file(self.report_xlsx(report_data,title=report_name),\
+                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',\
+                        as_attachment=True,download_name=filename)
                 report_preview = self.derive_report(report_data)
                 if debug: print(f'DEBUG: Report preview - {report_preview}')
                 return self.Markup(report_preview)
+            if apitype == 'portfolio':
+                # one report over all sheets, id is not used
+                report_name = self.request.args.get('name','afc')
+                report_type = self.request.args.get('type','csv')
+                report_opts = self.request.args.get('opts','both')
+                cursor.connection.close()
+                report_data = self.report_portfolio(report_name,type=report_type,\
+                 reop=[report_opts])
+                if report_type == 'excel':
+                    return self.send_file(self.report_xlsx(report_data,title=report_name),\
+                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',\
+                        as_attachment=True,download_name=f'All_sheets_{report_name}.xlsx')
+                return self.stream_page(self.iter_report_csv(report_data),mimetype='text/csv',\
+                    headers={'Content-Disposition':\
+                             f'attachment; filename="All_sheets_{report_name}.csv"'})
         if action == 'index' or action=='open':
             cursor = self.get_db_connection()
             sheets = self.get_sheets(cursor)
@@ -3100,7 +4258,7 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
             cursor.connection.close()
             return self.Markup(self.derive_template(content=content,\
                     header=self.derive_headers('open'),\
-                    css=self.compile_css(options=['table']),js=self.compile_js()))
+                    css=self.asset_url('css',['table']),js=self.asset_url('js')))
         if action == 'edit':
             # TODO: Implement nojs modifiers and handle state
             # TODO: Add header buttons
@@ -3121,31 +4279,12 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                 formdata = ''
             actions = self.get_action_list(cursor,tree)
             domain = self.get_domain_list(cursor)
-            content = f'''<div id="editor" class="editor" onscroll="scrollSync()">
-            <div id="tree" class="tree">{self.derive_tree(tree,domain=domain,actions=actions)}</div>      </div>
-            <div id="right-dlg" class="{dialog_class}">
-             <div id="right-dlg-hdr" class="right-dlg-hdr">
-              <div id="right-dlg-hdr-filler">&nbsp;</div>
-              <!-- <a class="right-dlg-hdr-a" href="#" onclick="toggleBetweenClasses('act-legend','act-legend-h','act-legend');return false">
-              Legend</a>&nbsp;-->
-              <a class="right-dlg-hdr-a" href="#" onclick="applyClass('right-dlg',
-               'right-dlg-hidden');ajaxHelperDestination('/fmea/jsapi/{id}/tree',null,'tree');return false">Hide</a>&nbsp;
-             </div>
-             <div id="right-dlg-content" class="right-dlg-content">
-             <div id="right-dlg-pretty-bottom" class="right-dlg-ftr">&nbsp;<br/></div>
-              {self.derive_action_legend(domain)}
-              <h3>Action List</h3><br/>
-              {self.derive_action_list(actions,domain,tree)}
-              {formdata}
-           <!-- TODO: Add content for all dialogs, hide contents using class -->
-            <!-- </div> -->
-            </div>
-           </div>'''
-            cursor.connection.close()
-            return self.Markup(self.derive_template(content=content,\
+            cursor.connection.close() # the page is rendered from memory
+            return self.stream_page(self.iter_template(content=self.iter_edit(id,tree,\
+                    actions,domain,dialog_class,formdata),\
                     header=self.derive_headers('edit',sheet_id=id),\
-                    css=self.compile_css(options=['tree']),\
-                    js =self.compile_js(options=['editor'])))
+                    css=self.asset_url('css',['tree']),\
+                    js =self.asset_url('js',['editor'])))
         if action == 'export':
             # listing of the reports with preview
             # TODO: Here we need pandas
@@ -3173,8 +4312,8 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
             No preview generated...</div><br/></div>'''
             return self.Markup(self.derive_template(content=content,\
                     header=self.derive_headers('report',sheet_id=id),\
-                    css=self.compile_css(options=['table']),\
-                    js =self.compile_js(options=['report'])))
+                    css=self.asset_url('css',['table']),\
+                    js =self.asset_url('js',['report'])))
         if action == 'jsapi':
             cursor = self.get_db_connection()
             api_html = f'NOTICE: Javacript API called for id {id}'
@@ -3189,6 +4328,7 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                 print(f'DEBUG: Form data object {fd}')
                 leaf_to_delete = None
                 target_id = None
+                patch = None
                 if fd is not None:
                     fd = fd.to_dict()
                     target_id = fd.get('id','NULL')
@@ -3201,13 +4341,24 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                                 re = anew.__sqliteself__(cursor)
                                 if re is None:
                                     print('WARNING: Nothing to update form db')
-                                anew.__nodeinband__(fd).__sqliteupdate__(cursor)
                             else:
                                 anew = FMEA_Failure_Mode().__nodeinband__(fd)
                                 re = anew.__sqliteself__(cursor)
                                 if re is None:
                                     print('WARNING: Nothing to update from db')
-                                anew.__nodeinband__(fd).__sqliteupdate__(cursor)
+                            moved_from = (anew.parentid,anew.parentclass) if re is not None else None
+                            anew.__nodeinband__(fd).__sqliteupdate__(cursor)
+                            # an edit in place only changes its own leaf, new or moved leafs
+                            # change the tree structure and get the whole tree
+                            leaf = self.get_sheet_leaf(cursor,anew.id,anew.__class__)
+                            if leaf is not None and moved_from == (leaf.parentid,leaf.parentclass):
+                                if leaf.parentid is None:
+                                    leaf_html = self.derive_leaf(leaf) # the root node never has actions
+                                else:
+                                    leaf_html = self.derive_leaf(leaf,\
+                                                leaf_acts=self.get_leaf_actions(cursor,leaf),\
+                                                leaf_dom=self.get_domain_list(cursor))
+                                patch = [(leaf.__htmlid__('fmeald'),leaf_html)]
                         else:
                             if apitype == 'leafdel':
                                 test_table = FMEA_Function().__sqlitetable__()
@@ -3221,20 +4372,29 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                                 leaf_to_delete.__nodeinband__({'id':target_id})
                             else:
                                 print(f'NOTICE: Not implemented hide of {target_id}')
-                tree = self.get_sheet_tree(cursor,id)
-                actions = self.get_action_list(cursor,tree)
-                domain = self.get_domain_list(cursor)
-                if leaf_to_delete is not None:
-                    # WARNING: Ensure leaf to delete is in tree
-                    print(f'DEBUG: Trying to delete {leaf_to_delete} from {list(l.id for l in tree)}')
-                    leaf_to_del = list(filter(lambda x:x.id == int(leaf_to_delete.id),tree))
-                    if len(leaf_to_del)>0:
-                        leaf_to_delete = leaf_to_del[0]
-                        tree = leaf_to_delete.delete_leaf(cursor,tree,actions)
+                if patch is not None:
+                    api_html = self.iter_patch(patch)
+                else:
+                    tree = self.get_sheet_tree(cursor,id)
+                    actions = self.get_action_list(cursor,tree)
+                    domain = self.get_domain_list(cursor)
+                    if leaf_to_delete is not None:
+                        # WARNING: Ensure leaf to delete is in tree
+                        print(f'DEBUG: Trying to delete {leaf_to_delete} from {list(l.id for l in tree)}')
+                        leaf_to_del = list(filter(lambda x:x.id == int(leaf_to_delete.id),tree))
+                        if len(leaf_to_del)>0:
+                            leaf_to_delete = leaf_to_del[0]
+                            tree = leaf_to_delete.delete_leaf(cursor,tree,actions)
+                            if leaf_to_delete.parentid is not None:
+                                # the branch holds the leaf and its children
+                                patch = [(f'fmea_tree_br_{leaf_to_delete.id}','')]
+                        else:
+                            print(f'WARNING: Attempted to delete {target_id}, but not found')
+                    if patch is not None:
+                        api_html = self.iter_patch(patch)
                     else:
-                        print(f'WARNING: Attempted to delete {target_id}, but not found')
-                tree_query = self.request.args.to_dict(flat=False)
-                api_html = self.derive_tree(tree,tree_query,actions=actions,domain=domain)
+                        tree_query = self.request.args.to_dict(flat=False)
+                        api_html = self.iter_tree(tree,tree_query,actions=actions,domain=domain)
             if apitype == 'actions' or apitype == 'actionup' or\
                apitype == 'actiondel':
                 # id is sheet id
@@ -3287,10 +4447,7 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                     actadd = FMEA_Action().__nodeinband__({'id':int(act_to_add)})
                     res = actadd.__sqliteself__(cursor)
                     if res is None: print('WARNING: Could not fetch action')
-                    if actadd.parentlist == '':
-                        actadd.parentlist = str(id) # we hope the node already exists
-                    else:
-                        actadd.parentlist = f'{actadd.parentlist},{str(id)}'
+                    actadd.__mtmaddparent__(id) # we hope the node already exists
                     if debug: print(f'NOTICE: Preparing to update {str(actadd)}')
                     res = actadd.__sqliteupdate__(cursor)
                     if res is None: print(f'ERROR: Could not update {str(actadd)}')
@@ -3342,15 +4499,10 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                     source_leaf = source_leaf
                 else:
                     if apitype=='actionaddnode':
-                        current_parentlist = act.parentlist.split(',')
-                        current_parentlist.append(str(source_leaf))
-                        act.parentlist = ','.join(list(set(current_parentlist)))
+                        act.__mtmaddparent__(source_leaf)
                     else:
                         if apitype=='actiondelnode':
-                            current_parentlist = act.parentlist.split(',')
-                            new_parentlist = list(filter(lambda x:int(x)!=source_leaf,\
-                                current_parentlist))
-                            act.parentlist =','.join(list(set(new_parentlist)))
+                            act.__mtmdelparent__(source_leaf)
                     act.__sqliteupdate__(cursor)
                 api_html = self.derive_action_edit(cursor,act,id)
             if apitype == 'actionnew':
@@ -3374,8 +4526,54 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
                 # we are not using add parent here
                 api_html = self.derive_action_edit(cursor,act,id)
             cursor.connection.close()
+            if not isinstance(api_html,str):
+                return self.stream_page(api_html) # rendered from memory as it is sent
             return api_html
         return f'NOTICE: {action} called for {id}'
+    def app_build(self):
+        # hash of the application code, pages rendered by another build are not reused
+        build = self.__dict__.get('_build_',None)
+        if build is None:
+            try:
+                with open(__file__,'rb') as source:
+                    build = self.sha256(source.read()).hexdigest()[:16]
+            except Exception as e:
+                print(f'WARNING: Could not hash the application saying {e.args}')
+                build = str(id(self))
+            self._build_ = build
+        return build
+    def route_etag(self,action,id,apitype):
+        # the entity tag of a read only route of one sheet, None when the route
+        # changes data or depends on more than the revisions of get_sheet_revision
+        if not self.app.config.get('CONDITIONAL_ROUTES',False) or self.request.method != 'GET':
+            return None
+        if not (action == 'edit' or (action == 'jsapi' and apitype == 'tree') or\
+                (action in ['redirect','proxy'] and apitype == 'report')):
+            return None
+        cursor = self.get_db_connection()
+        revision = self.get_sheet_revision(cursor,id,actions=apitype == 'report' and\
+                                           self.request.args.get('name','afc') == 'aadc')
+        cursor.connection.close()
+        if revision is None:
+            return None
+        settings = tuple(self.app.config[k] for k in ['PREVIEW_LINES','MAX_TREE_DEPTH',\
+                         'MAX_CHARS_DESCRIPTION','db_file'])
+        return self.sha256(repr((self.app_build(),settings,action,str(id),apitype,revision,\
+                           self.request.query_string)).encode('utf-8')).hexdigest()[:24]
+    def handle_conditional(self,path='/',action='index',id=0,apitype='apinojs'):
+        # answer the sheet routes with an ETag, a client holding the current copy gets
+        # 304 before anything is loaded or rendered
+        etag = self.route_etag(action,id,apitype)
+        if etag is None:
+            return self.handle_route(path=path,action=action,id=id,apitype=apitype)
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        if etag in self.request.if_none_match:
+            return self.app.response_class(status=304,headers=headers)
+        response = self.app.make_response(self.handle_route(path=path,action=action,\
+                                                            id=id,apitype=apitype))
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
     def handle_main_redirect(self,path='/',action='index',id=0,apitype='apinojs'):
         return self.redir('/fmea',code=302)
     def register_routes(self):
@@ -3386,6 +4584,20 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
             script_folder = self.path.dirname(__file__)
             app = self.Flask(__name__)
             self.__setattr__('app',app)
+        self.app.teardown_appcontext(self.handle_teardown)
+        fmea = self
+        class MemoryRequest(self.app.request_class):
+            # uploaded files are kept in memory instead of spooled to temp files,
+            # requests larger than UPLOAD_MAX_BYTES are refused
+            @property
+            def max_content_length(self):
+                return fmea.app.config['UPLOAD_MAX_BYTES']
+            def _get_file_stream(self,total_content_length,content_type,filename=None,\
+                                 content_length=None):
+                return fmea.BytesIO()
+        self.app.request_class = MemoryRequest
+        self.app.add_url_rule('/fmea/asset/<name>','fmea_asset',view_func=self.handle_asset,\
+            methods=['GET'])
         self.app.add_url_rule('/fmea','fmea_index',view_func=self.handle_route,\
             defaults={'action': 'index', 'id': '0','apitype': 'apidefault'},\
             methods=['GET','POST','PUT'])
@@ -3393,13 +4605,13 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
             defaults={'action': 'index', 'id': '0','apitype': 'apidefault'},\
             methods=['GET','POST','PUT'])
         self.app.add_url_rule('/fmea/<action>/<id>','fmea_action',\
-            view_func=self.handle_route, defaults={'apitype': 'apidefault'},\
+            view_func=self.handle_conditional, defaults={'apitype': 'apidefault'},\
             methods=['GET','POST','PUT'])
         self.app.add_url_rule('/fmea/<action>/<id>/','fmea_apiroot',\
-            view_func=self.handle_route, defaults={'apitype': 'apidefault'},\
+            view_func=self.handle_conditional, defaults={'apitype': 'apidefault'},\
             methods=['GET','POST','PUT'])
         self.app.add_url_rule('/fmea/<action>/<id>/<apitype>','fmea_api',\
-            view_func=self.handle_route, methods=['GET','POST','PUT'])
+            view_func=self.handle_conditional, methods=['GET','POST','PUT'])
         if len(list(filter(lambda x:x.endpoint == '/', self.app.url_map.iter_rules()))) == 0:
             self.app.add_url_rule('/','index_redirect',view_func=self.handle_main_redirect,\
                 defaults={'action': 'index', 'id': '0','apitype': 'apidefault'},\
@@ -3407,6 +4619,9 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
     def run(self):
         # start the application
         print(list(r.endpoint for r in self.app.url_map.iter_rules()))
+        cursor = self.get_db_connection()
+        self.check_schema(cursor) # verify or install the tables once at startup
+        cursor.connection.close()
         self.app.debug=True
         self.app.run(host="0.0.0.0", port=5005)
     def import_from_file(self,filename,cursor,sqlite3=None,debug=False):
@@ -3414,7 +4629,28 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
         if sqlite3 is None:
             sqlite3 = self.sqlite3
         if debug: print('DEBUG IMPORT: Stage 1 - opening the file')
-        newcon = sqlite3.connect(filename)
+        return self.import_from_connection(sqlite3.connect(filename),cursor,debug)
+    def import_from_bytes(self,data,cursor,sqlite3=None,debug=False):
+        # import data into table from the bytes of an FMEA file, the file is only
+        # opened as an in-memory database, returns None when it is not a database
+        if sqlite3 is None:
+            sqlite3 = self.sqlite3
+        if debug: print(f'DEBUG IMPORT: Stage 1 - reading {len(data)} bytes')
+        if data[18:20] == bytes([2,2]):
+            # saved in WAL mode, the in-memory copy has no -wal file to read
+            data = data[:18]+bytes([1,1])+data[20:]
+        newcon = sqlite3.connect(':memory:')
+        try:
+            newcon.deserialize(data)
+            newcon.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        except Exception as e:
+            print(f'''ERROR: Cannot read uploaded FMEA file
+                Reason is {e.__class__.__name__}: {e.args}''')
+            newcon.close()
+            return None
+        return self.import_from_connection(newcon,cursor,debug)
+    def import_from_connection(self,newcon,cursor,debug=False):
+        # import data into table from an open FMEA database, which is closed after
         newcur = newcon.cursor()
         bail = False
         if debug: print('DEBUG IMPORT: Stage 2 - searching the first table')
@@ -3434,80 +4670,214 @@ f'{self.util_clean_name(list(filter(lambda x:x.parentid is None, tree))[0]["titl
         newtree = []
         if debug: print(f'DEBUG IMPORT: Stage 3 - building the structures if bail({bail}) is False')
         if bail == False:
-            newtree = FMEA_Function().get_from_db(newcur,None,newtree)
+            newtree = FMEA_Function().bulk_from_db(newcur,None,newtree)
             if len(newtree) >= 1:
-                # we have only imported the root, let's try again
-                newtree = newtree[0].get_from_db(newcur,newtree[0].id,newtree)
-            # TODO: KNOWN BUG - Functions do not get imported
+                # we have only imported the root, let's load its functions
+                newtree = FMEA_Function().bulk_from_db(newcur,newtree[0].id,newtree)
             if debug: print(f'''DEBUG IMPORT: Stage 4 - creating function lookup from {list(str(l) for l in newtree)}''')
-            newtree = FMEA_Failure_Mode().get_from_db(newcur,None,newtree)
-            newacts = FMEA_Action().get_from_db(newcur,newtree)
+            newtree = FMEA_Failure_Mode().bulk_from_db(newcur,None,newtree)
+            newacts = FMEA_Action().bulk_from_db(newcur,newtree,[])
             newcon.close()
             if debug: print(f'''DEBUG IMPORT: Stage 4 - creating node lookup from {list(str(l) for l in newtree)}''')
-            eqdi = dict()
-            newtree[0].__treesort__(newtree)
-            newsheetid = 0
-            for leaf in newtree:
-                newid = eqdi.get(int(leaf.id),int(self.util_new_node(cursor)))
-                eqdi[int(leaf.id)] = newid
-                if debug: print(f'DEBUG: Reasigning {str(leaf)} to id: {newid} dict size {len(eqdi)}')
-                leaf.id = newid
-                if leaf.parentid is not None:
-                    newid = eqdi.get(int(leaf.parentid),int(self.util_new_node(cursor))+1)
-                    eqdi[int(leaf.parentid)] = newid
-                    leaf.parentid = newid
-                else:
-                    newsheetid = newid
-                if leaf.__contains__('sheetid'):
-                    leaf['sheetid']=newsheetid
-                res = leaf.__sqliteupdate__(cursor)
-                if res is None:
-                    print('ERROR: Could not insert node {leaf.id}')
-            if debug: print('DEBUG IMPORT: Stage 5 - creating action lookup')
-            aqdi = dict()
-            for act in newacts:
-                newid = act.__sqlitenextid__(cursor)
-                aqdi[act.id] = newid
-                act.id = newid
-                old_parentlist = act.parentlist
-                new_parentlist = ''
-                for pid in old_parentlist.split(','):
-                    try:
-                        if debug: print(f'''DEBUG: Attemting to attach action {act.id} to parent {pid.strip()} which has been matched to {eqdi.get(int(pid.strip()),'NOT FOUND')}''')
-                        if len(new_parentlist) == 0:
-                            new_parentlist = str(eqdi.get(int(pid.strip()),''))
-                        else:
-                            new_parentlist = f'{new_parentlist}, {eqdi.get(int(pid.strip()),"")}'
-                    except Exception as e:
-                        print(f'ERROR: Exception {e.__class__.__name__} saying {e.args}')
-                if new_parentlist == '':
-                    print('WARNING: Some orphan actions have been detected')
-                act.parentlist = new_parentlist
-                res = act.__sqliteupdate__(cursor)
+            # the whole sheet is written as one unit of work holding the write lock from
+            # the id reservation to the commit, one commit at the end
+            batch = SqliteBatch(cursor,immediate=True)
+            with batch:
+                # reserve one id block for the nodes and one for the actions, the ids are
+                # remapped in memory and each table is written with one executemany
+                next_node = self.util_new_node(cursor)
+                next_act = FMEA_Action().__sqlitenextid__(cursor,silent=True)
+                if next_act is None:
+                    next_act = 0
+                eqdi = dict((int(leaf.id),next_node+i) for i,leaf in enumerate(newtree))
+                next_node += len(newtree)
+                if debug: print(f'DEBUG IMPORT: Stage 5 - reserved node ids from {next_node-len(newtree)} to {next_node-1}')
+                newsheetid = 0
+                for leaf in newtree:
+                    leaf.id = eqdi[int(leaf.id)]
+                    if leaf.parentid is not None:
+                        if int(leaf.parentid) not in eqdi:
+                            # parent missing from the file, keep the orphan apart
+                            eqdi[int(leaf.parentid)] = next_node
+                            next_node += 1
+                        leaf.parentid = eqdi[int(leaf.parentid)]
+                    else:
+                        newsheetid = leaf.id
+                    if leaf.__contains__('sheetid'):
+                        leaf['sheetid']=newsheetid
+                    res = leaf.__sqliteupdate__(cursor)
+                    if res is None:
+                        print(f'ERROR: Could not insert node {leaf.id}')
+                if debug: print('DEBUG IMPORT: Stage 6 - creating action lookup')
+                orphans = 0
+                for i,act in enumerate(newacts):
+                    act.id = next_act+i
+                    new_parents = list(eqdi[p] for p in act.__mtmparentids__() if p in eqdi)
+                    if len(new_parents) == 0:
+                        orphans += 1
+                    act.__mtmsetparents__(new_parents)
+                    res = act.__sqliteupdate__(cursor)
+                if orphans > 0:
+                    print(f'WARNING: {orphans} orphan actions have been detected')
+            if batch.failed:
+                print('ERROR: Import rolled back, nothing was written')
+                return None
         else:
             if debug: print('DEBUG IMPORT: Bailed - nothing happened')
             newcon.close()
         # actions can be recuperated from database
         return newtree
-    def export_to_file(self,tree,actions,filename,cursor,sqlite3):
-        # save current sheet into a file
-        newcon = sqlite3.connect(filename)
+    def export_to_bytes(self,id,sqlite3=None):
+        # build the sheet database in memory and return it serialized, sqlite copies
+        # the rows of the sheet from the attached main database, nothing touches the disk
+        if sqlite3 is None:
+            sqlite3 = self.sqlite3
+        id = int(id)
+        funcs = FMEA_Function()
+        fails = FMEA_Failure_Mode()
+        acts = FMEA_Action()
+        link = acts.__mtmlinktable__()
+        copies = [(funcs,'id = ? OR parentid = ?',(id,id)),(fails,'sheetid = ?',(id,)),\
+                  (acts,f'''id IN (SELECT id FROM sheet.{link} WHERE parentid IN (
+                   SELECT id FROM sheet.{fails.__sqlitetable__()} WHERE sheetid = ? UNION
+                   SELECT id FROM sheet.{funcs.__sqlitetable__()} WHERE parentid = ?))''',(id,id))]
+        data = None
+        newcon = sqlite3.connect(':memory:')
         newcur = newcon.cursor()
         try:
-            newcur = newcur.execute(FMEA_Function().__sqlitecreate__(newcur))
-            newcur = newcur.execute(FMEA_Failure_Mode().__sqlitecreate__(newcur))
-            newcur = newcur.execute(FMEA_Action().__sqlitecreate__(newcur))
+            for node,where,params in copies:
+                newcur = newcur.execute(node.__sqlitecreate__(newcur))
+            newcur = newcur.executescript(acts.__mtmlinkcreate__())
+            newcur = newcur.execute('ATTACH DATABASE ? AS sheet',\
+                                    (self.path.abspath(self.app.config['db_file']),))
+            for node,where,params in copies:
+                fields = node.__sqlitefields__()
+                table = node.__sqlitetable__()
+                newcur = newcur.execute(f'INSERT INTO main.{table}({fields}) SELECT {fields} FROM sheet.{table} WHERE {where}',params)
+            newcur = newcur.execute(f'INSERT INTO main.{link}(id, parentid) SELECT id, parentid FROM sheet.{link} WHERE id IN (SELECT id FROM main.{acts.__sqlitetable__()})')
+            newcon.commit()
+            newcur = newcur.execute('DETACH DATABASE sheet')
+            data = newcon.serialize()
         except Exception as e:
-            print(f'''ERROR: could not create tables in export file {filename}
+            print(f'''ERROR: could not export sheet {id} in memory
                 Reason is {e.__class__.__name__}: {e.args}''')
-        else:
-            for leaf in tree:
-                res = leaf.__sqliteupdate__(newcur)
-            for act in actions:
-                res = act.__sqliteupdate__(newcur)
-            newcon.commit()
         finally:
             newcon.close()
+        return data
+    def app_migrate(self,cursor,tables=None):
+        # bring a database created by an older version to the current layout
+        # only tables already verified are touched, returns True when the schema changed
+        if tables is None:
+            tables = set(n.__sqlitetable__() for n in [FMEA_Function(),\
+                         FMEA_Failure_Mode(),FMEA_Action(),FMEA_Domain()])
+        existing = set(r[0] for r in cursor.execute('SELECT name FROM sqlite_master').fetchall())
+        changed = False
+        # step 1: secondary indexes on the tree tables
+        for node in [FMEA_Function(),FMEA_Failure_Mode()]:
+            if node.__sqlitetable__() not in tables:
+                continue
+            for name,statement in node.__sqliteindexes__().items():
+                if name in existing:
+                    continue
+                print(f'NOTICE: Creating index {name}')
+                try:
+                    cursor = cursor.execute(statement)
+                    cursor.connection.commit()
+                except Exception as e:
+                    print(f'ERROR: Index {name} failed with {e.__class__.__name__} saying {e.args}')
+                changed = True
+        # step 2: action parents from parentlist into the link table
+        act = FMEA_Action()
+        link_table = act.__mtmlinktable__()
+        if act.__sqlitetable__() in tables and link_table not in existing:
+            print(f'NOTICE: Migrating action parentlist into {link_table}')
+            try:
+                cursor = cursor.executescript(act.__mtmlinkcreate__())
+                actions = act.__sqliteall__(cursor,extra_where='parentlist IS NOT NULL')
+                cursor = cursor.executemany(f'INSERT OR IGNORE INTO {link_table}(id, parentid) VALUES (?, ?)',\
+                    list((a.id,p) for a in actions for p in a.__mtmparentids__()))
+                cursor.connection.commit()
+            except Exception as e:
+                print(f'ERROR: Migration to {link_table} failed with {e.__class__.__name__} saying {e.args}')
+            changed = True
+        # step 3: sheet revisions, bumped by triggers on the tables of the sheet
+        if changed:
+            existing = set(r[0] for r in cursor.execute('SELECT name FROM sqlite_master').fetchall())
+        triggers = self.app_revision_triggers()
+        # sqlite keeps the create statement without IF NOT EXISTS, a trigger written by
+        # an older version has a different one and is created again
+        stored = dict(cursor.execute('SELECT name, sql FROM sqlite_master WHERE type = ?',\
+                                     ('trigger',)).fetchall())
+        outdated = set(name for name,statement in triggers.items() if name in stored and\
+                       stored[name] != statement.replace(' IF NOT EXISTS','',1))
+        needed = set(n.__sqlitetable__() for n in [FMEA_Function(),FMEA_Failure_Mode(),\
+                     FMEA_Action(),FMEA_Domain()])|{link_table}
+        if needed <= existing and (self.revision_table not in existing or\
+                                   len(set(triggers)-existing) > 0 or len(outdated) > 0):
+            print(f'NOTICE: Creating sheet revisions in {self.revision_table}')
+            try:
+                cursor = cursor.execute(f'CREATE TABLE IF NOT EXISTS {self.revision_table}'\
+                                        '(id INTEGER PRIMARY KEY, revision INTEGER NOT NULL)')
+                for name in outdated:
+                    cursor = cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                for name,statement in triggers.items():
+                    if name not in existing or name in outdated:
+                        cursor = cursor.execute(statement)
+                cursor.connection.commit()
+            except Exception as e:
+                print(f'ERROR: Revision triggers failed with {e.__class__.__name__} saying {e.args}')
+            changed = True
+        return changed
+    def app_revision_triggers(self):
+        # return the create statements of the triggers bumping the sheet revision by
+        # trigger name, the sheet comes from the row written: functions hang from the
+        # sheet, failure modes carry sheetid, actions and links go through the parents
+        fun = FMEA_Function().__sqlitetable__()
+        fm = FMEA_Failure_Mode().__sqlitetable__()
+        act = FMEA_Action().__sqlitetable__()
+        link = FMEA_Action().__mtmlinktable__()
+        dom = FMEA_Domain().__sqlitetable__()
+        def sheets(table,row):
+            if table == fun:
+                return f'SELECT CASE WHEN typeof({row}.parentid) = \'integer\' '\
+                       f'THEN {row}.parentid ELSE {row}.id END AS sheet'
+            if table == fm:
+                return f'SELECT {row}.sheetid AS sheet'
+            parents = f'{row}.parentid' if table == link else\
+                      f'SELECT parentid FROM {link} WHERE id = {row}.id'
+            return f'SELECT sheetid AS sheet FROM {fm} WHERE id IN ({parents}) UNION '\
+                   f'SELECT CASE WHEN typeof(parentid) = \'integer\' THEN parentid ELSE id END '\
+                   f'FROM {fun} WHERE id IN ({parents})'
+        triggers = dict()
+        for table in [fun,fm,act,link,dom]:
+            for event,rows in [('insert',['NEW']),('update',['OLD','NEW']),('delete',['OLD'])]:
+                if table == dom:
+                    # the domain is shared, it has its own row read with every sheet
+                    bump = f'INSERT INTO {self.revision_table}(id, revision) VALUES '\
+                           f'({self.revision_domain}, 1) '\
+                           'ON CONFLICT(id) DO UPDATE SET revision = revision + 1;'
+                else:
+                    bump = f'INSERT INTO {self.revision_table}(id, revision) SELECT sheet, 1 FROM '\
+                           f'({" UNION ".join(sheets(table,r) for r in rows)}) '\
+                           'WHERE typeof(sheet) = \'integer\' '\
+                           'ON CONFLICT(id) DO UPDATE SET revision = revision + 1;'
+                if table in [act,link]:
+                    bump += f' INSERT INTO {self.revision_table}(id, revision) VALUES '\
+                            f'({self.revision_actions}, 1) '\
+                            'ON CONFLICT(id) DO UPDATE SET revision = revision + 1;'
+                triggers[f'{table}_revision_{event}'] = f'CREATE TRIGGER IF NOT EXISTS '\
+                    f'{table}_revision_{event} AFTER {event.upper()} ON {table} BEGIN {bump} END'
+        return triggers
+    def app_explain(self,cursor):
+        # return the query plan details of the sheet loads by name, the queries the
+        # bulk loaders and the lazy preview issue, each one must be answered by an index
+        return {'sheets': FMEA_Function().__sqliteplan__(cursor,'parentid IS NULL'),\
+                'functions': FMEA_Function().__sqliteplan__(cursor,\
+                             '( id = ? OR parentid = ? )',(0,0)),\
+                'failure modes': FMEA_Failure_Mode().__sqliteplan__(cursor,'sheetid = ?',(0,)),\
+                'failure mode children': FMEA_Failure_Mode().__sqliteplan__(cursor,\
+                                         'sheetid = ? AND parentid = ?',(0,0)),\
+                'action links': FMEA_Action().__mtmlinkplan__(cursor)}
     def app_install(self,cursor):
         # create the tables in database
         FMEA_Function().create_in_db(cursor)
@@ -0,0 +1,44 @@
+# full aadc report lines of a 10k action sheet: iter_aadc_table on pandas columns
+# against the former loop, which split the parentlist again and filtered all failure
+# modes once per action to find its risk levels
+# run with: python -m pytest -q tests/bench_aadc.py
+import time
+
+from FMEA_App import FMEA_Failure_Mode
+
+ACTIONS = 10000
+FAILURE_MODES = 2000
+
+
+def equipment_by_filter(tree,actions):
+    # (action, risk levels) from the last action to the first, found the former way
+    failure_modes = list(filter(lambda x:x.__class__.__name__ == FMEA_Failure_Mode.__name__,tree))
+    for act in reversed(actions):
+        apl = list(filter(lambda y:y is not None,list(map(lambda x:int(x.strip()) \
+                          if x.strip().isnumeric() else None,act.parentlist.split(',')))))
+        yield act,sorted(set(map(lambda x:x.risk_level,list(filter(lambda y:y.id in apl,\
+                                 failure_modes)))),key=str)
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return time.perf_counter()-start,result
+
+
+def test_aadc_lines_on_10k_actions(fmea,fmea_sheet,capsys):
+    sheet = fmea_sheet(functions=50,failure_modes=FAILURE_MODES,actions=ACTIONS)
+    cursor = fmea.get_db_connection()
+    tree = fmea.get_sheet_tree(cursor,sheet)
+    actions = fmea.get_action_list(cursor,tree)
+    cursor.connection.close()
+    root = list(filter(lambda x:x.parentid is None,tree))[0]
+    loop,expected = timed(lambda:list(fmea.iter_aadc_lines(root,equipment_by_filter(tree,actions),\
+                                                           actions,['both'],'csv')))
+    table,lines = timed(lambda:list(fmea.iter_aadc_table(root,tree,actions,['both'],'csv')))
+    with capsys.disabled():
+        print(f'\naadc, {len(actions)} actions, {FAILURE_MODES} failure modes, {len(lines)} lines')
+        print(f'per action filter {loop*1000:10.0f} ms')
+        print(f'iter_aadc_table   {table*1000:10.0f} ms')
+        print(f'speedup           {loop/table:10.1f} x')
+    assert lines == expected
@@ -0,0 +1,43 @@
+# jsapi latency through the Flask test client with and without the connection
+# pool (DB_POOL), on a small generated sheet
+# run with: python -m pytest -q tests/bench_pool.py
+import contextlib
+import io
+import time
+
+from FMEA_App import FMEA_Failure_Mode
+
+REQUESTS = 300
+WARMUP = 20
+
+
+def latency(client,url):
+    # milliseconds per request after a warm up
+    for i in range(WARMUP):
+        client.put(url)
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        client.put(url)
+    return (time.perf_counter()-start)/REQUESTS*1000
+
+
+def test_jsapi_latency_with_and_without_pool(fmea,fmea_sheet,capsys):
+    sheet = fmea_sheet(functions=3,failure_modes=20,actions=5)
+    cursor = fmea.get_db_connection()
+    leaf = list(filter(lambda x:isinstance(x,FMEA_Failure_Mode),fmea.get_sheet_tree(cursor,sheet)))[0]
+    cursor.connection.close()
+    fmea.register_routes()
+    client = fmea.app.test_client()
+    urls = [f'/fmea/jsapi/{leaf.id}/leafedit',f'/fmea/jsapi/{sheet}/tree',f'/fmea/jsapi/{sheet}/actions']
+    results = dict()
+    for pool in (False,True):
+        fmea.app.config['DB_POOL'] = pool
+        for url in urls:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[(url,pool)] = latency(client,url)
+    with capsys.disabled():
+        print(f'\njsapi latency, {REQUESTS} requests each (ms per request)')
+        print(f'{"request":32s} {"no pool":>8s} {"pool":>8s}')
+        for url in urls:
+            print(f'{url:32s} {results[(url,False)]:8.2f} {results[(url,True)]:8.2f}')
+    assert all(response.status_code == 200 for response in [client.put(url) for url in urls])
@@ -0,0 +1,54 @@
+# per node reflection overhead of AttrAccess: the class schema read by the helpers
+# against the dir() walk each of them did on every call before it
+# run with: python -m pytest -q tests/bench_reflection.py
+import timeit
+
+from FMEA_App import FMEA_Failure_Mode
+
+NODES = 2000
+REPEAT = 5
+
+
+def reflect(node):
+    # the field enumeration of the AttrAccess helpers before the class schema
+    return list(filter(lambda y:(y[0]!='_' and not callable(node[y])),dir(node)))
+
+
+def inband_walk(node,values):
+    # the former __nodeinband__ of a dict, the same conversions over a dir() walk
+    for fieldname in reflect(node):
+        value = values.get(fieldname,None)
+        if value is not None:
+            node[fieldname] = value if node[fieldname] is None else node[fieldname].__class__(value)
+    return node
+
+
+def per_node(call,nodes):
+    # best time of one call over all nodes, in microseconds per node
+    best = min(timeit.repeat(lambda:[call(node) for node in nodes],number=1,repeat=REPEAT))
+    return best/len(nodes)*1e6
+
+
+def test_reflection_per_node(fmea,fmea_sheet,capsys):
+    sheet = fmea_sheet(failure_modes=NODES,actions=0)
+    cursor = fmea.get_db_connection()
+    nodes = list(filter(lambda x:isinstance(x,FMEA_Failure_Mode),fmea.get_sheet_tree(cursor,sheet)))
+    cursor.connection.close()
+    values = dict((id(node),node.__nodetodict__()) for node in nodes)
+    rows = [
+        ('__nodeattrs__',lambda n:n.__nodeattrs__(),reflect),
+        ('__contains__',lambda n:'risk_level' in n,lambda n:'risk_level' in reflect(n)),
+        ('__nodetolist__',lambda n:n.__nodetolist__(),lambda n:list(n[f] for f in reflect(n))),
+        ('__nodeinband__',lambda n:n.__nodeinband__(values[id(n)]),\
+         lambda n:inband_walk(n,values[id(n)])),
+        ('__sqlitetypes__',lambda n:n.__sqlitetypes__(),\
+         lambda n:list(type(getattr(n.__class__,f)).__name__ for f in reflect(n))),
+    ]
+    with capsys.disabled():
+        print(f'\nreflection per node, {len(nodes)} failure modes (us, best of {REPEAT})')
+        print(f'{"helper":18s} {"dir() walk":>10s} {"schema":>10s}')
+        for name,schema,walk in rows:
+            before = per_node(walk,nodes)
+            after = per_node(schema,nodes)
+            print(f'{name:18s} {before:10.2f} {after:10.2f}')
+    assert per_node(lambda n:n.__nodeattrs__(),nodes) < per_node(reflect,nodes)
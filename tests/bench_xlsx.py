@@ -0,0 +1,40 @@
+# time and peak memory (tracemalloc) of the xlsx report: the write-only workbook of
+# report_xlsx against the DataFrame.to_excel file it replaced, on the aadc report of
+# a generated sheet
+# run with: python -m pytest -q tests/bench_xlsx.py
+import time
+import tracemalloc
+
+ACTIONS = 1000
+FAILURE_MODES = 2000
+
+
+def measure(call):
+    # seconds of one call and its peak MiB in a second, traced, call (tracing
+    # slows the writers down several times)
+    start = time.perf_counter()
+    call()
+    seconds = time.perf_counter()-start
+    tracemalloc.start()
+    try:
+        call()
+        return seconds,tracemalloc.get_traced_memory()[1]/2**20
+    finally:
+        tracemalloc.stop()
+
+
+def test_xlsx_time_and_peak_memory(fmea,fmea_sheet,tmp_path,capsys):
+    sheet = fmea_sheet(failure_modes=FAILURE_MODES,actions=ACTIONS)
+    report = fmea.report_build(sheet,'aadc',type='excel',debug=False)
+    def to_excel():
+        fmea.pd.DataFrame(data=list(l['line'] for l in report['lines']),\
+                          columns=report['header']).to_excel(tmp_path/'report.xlsx')
+    def write_only():
+        fmea.report_xlsx(report,title='aadc').close()
+    results = [('DataFrame.to_excel',)+measure(to_excel),('report_xlsx',)+measure(write_only)]
+    with capsys.disabled():
+        print(f'\naadc xlsx, {len(report["lines"])} rows')
+        print(f'{"writer":20s} {"time s":>8s} {"peak MiB":>9s}')
+        for name,seconds,peak in results:
+            print(f'{name:20s} {seconds:8.2f} {peak:9.1f}')
+    assert results[1][2] < results[0][2]
@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FMEA_App import FMEA_Action, FMEA_App, FMEA_Failure_Mode, FMEA_Function, SqliteBatch
+
+
+@pytest.fixture
+def fmea(tmp_path):
+    # an application on an empty database, installed like at startup
+    app = FMEA_App()
+    app.try_imports()
+    app.get_config()
+    app.app.config['db_file'] = str(tmp_path/'fmea.sqlite3')
+    cursor = app.get_db_connection()
+    app.check_schema(cursor)
+    cursor.connection.close()
+    yield app
+    app.close_db_pool()
+
+
+@pytest.fixture
+def fmea_sheet(fmea):
+    # fill a sheet of the fmea database: functions under the sheet, failure modes
+    # under them or under each other and actions linked to one to four failure modes,
+    # returns the sheet id
+    def fill(id=0,functions=20,failure_modes=200,actions=60,seed=1):
+        rnd = random.Random(seed)
+        cursor = fmea.get_db_connection()
+        fmea.check_schema(cursor)
+        tree = max(FMEA_Function().__sqlitenextid__(cursor,silent=True) or 0,\
+                   FMEA_Failure_Mode().__sqlitenextid__(cursor,silent=True) or 0,id+1)
+        act = FMEA_Action().__sqlitenextid__(cursor,silent=True) or 1
+        with SqliteBatch(cursor):
+            FMEA_Function().__nodeinband__({'id':id,'parentid':None,'title':f'Sheet {id}',\
+                'asset_name':'P-1','asset_description':'Pump','asset_criticality':'B',\
+                'parentclass':'FMEA_Function'}).__sqliteupdate__(cursor)
+            funcs = list(range(tree,tree+functions))
+            for f in funcs:
+                FMEA_Function().__nodeinband__({'id':f,'parentid':id,'title':f'Func {f}',\
+                    'parentclass':'FMEA_Function'}).__sqliteupdate__(cursor)
+            fms = []
+            for fm in range(tree+functions,tree+functions+failure_modes):
+                if len(fms) > 0 and rnd.random() < 0.6:
+                    parent,parentclass = rnd.choice(fms),'FMEA_Failure_Mode'
+                else:
+                    parent,parentclass = rnd.choice(funcs),'FMEA_Function'
+                FMEA_Failure_Mode().__nodeinband__({'id':fm,'parentid':parent,\
+                    'parentclass':parentclass,'sheetid':id,'title':f'FM {fm}',\
+                    'description':f'long description number {fm}','means_of_identification':\
+                    f'means {fm}','discipline':rnd.choice(['Fixed','Rotating','Others']),\
+                    'risk_level':rnd.choice(['1','2','4','6','9'])}).__sqliteupdate__(cursor)
+                fms.append(fm)
+            for a in range(act,act+actions):
+                FMEA_Action().__nodeinband__({'id':a,'title':f'Act {a}',\
+                    'parentlist':','.join(map(str,rnd.sample(fms,rnd.randint(1,4)))),\
+                    'description':f'action description {a}','category':rnd.choice(\
+                    ['Advanced monitoring','Design Upgrade','Other Actions','']),\
+                    'templating_equipment':'Pump','templating_group':'Rotating',\
+                    'frequency_for_A_criticality':'Every week','frequency_for_B_criticality':\
+                    'Every month','frequency_for_C_criticality':'Every year',\
+                    'frequency_for_D_criticality':'On demand'}).__sqliteupdate__(cursor)
+        cursor.connection.close()
+        return id
+    return fill
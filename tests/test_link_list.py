@@ -0,0 +1,32 @@
+from FMEA_App import FMEA_Action, LinkList
+
+
+def actions():
+    acts = LinkList()
+    for id,parents in [(1,'10'),(2,'10,11'),(3,'11')]:
+        act = FMEA_Action().__nodeinband__({'id':id,'parentlist':parents,'title':f'act {id}'})
+        act.__mtmattach__(acts)
+    return acts
+
+
+def ids(index,parent):
+    return list(a.id for a in index.get(parent,[]))
+
+
+def test_index_follows_direct_parentlist_assignment():
+    acts = actions()
+    assert ids(FMEA_Action().__mtmindex__(acts),10) == [1,2]
+    acts[0].parentlist = '11'
+    index = FMEA_Action().__mtmindex__(acts)
+    assert ids(index,10) == [2]
+    assert ids(index,11) == [1,2,3]
+
+
+def test_index_follows_subscript_and_in_band_assignment():
+    acts = actions()
+    FMEA_Action().__mtmindex__(acts)
+    acts[2]['parentlist'] = '12'
+    acts[1].__nodeinband__({'id':2,'parentlist':'12','title':'act 2'})
+    index = FMEA_Action().__mtmindex__(acts)
+    assert ids(index,12) == [2,3]
+    assert ids(index,11) == []
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize('name,index',[('sheets','fmea_function_by_parentid_id'),\
+    ('functions','fmea_function_by_parentid_id'),\
+    ('failure modes','fmea_failure_mode_by_sheetid'),\
+    ('failure mode children','fmea_failure_mode_by_sheetid_parentid_id'),\
+    ('action links','fmea_action_link_by_parent')])
+def test_sheet_loads_use_the_indexes(fmea,name,index):
+    cursor = fmea.get_db_connection()
+    details = fmea.app_explain(cursor)[name]
+    cursor.connection.close()
+    # a SCAN is a full pass even when it walks the id index for the order by
+    assert not any(d.startswith('SCAN') for d in details), details
+    assert any(index in d for d in details), details
@@ -0,0 +1,24 @@
+def test_csv_route_streams_the_rows_without_caching(fmea):
+    fmea.register_routes()
+    cursor = fmea.get_db_connection()
+    id = fmea.get_sheets(cursor)[0].id # creates the default sheet
+    cursor.connection.close()
+    expected = ''.join(fmea.iter_report_csv(fmea.report_build(id,'afc',type='csv',debug=False)))
+    response = fmea.app.test_client().get(f'/fmea/redirect/{id}/report?name=afc&type=csv',\
+                                          buffered=False)
+    assert response.is_streamed
+    assert b''.join(response.response).decode() == expected
+    response.close()
+    assert len(fmea.report_cache()['entries']) == 0
+
+
+def test_report_rows_give_back_the_connection_when_closed(fmea):
+    cursor = fmea.get_db_connection()
+    fmea.get_sheets(cursor)
+    cursor.connection.close()
+    local = fmea.get_db_pool()['local']
+    report = fmea.report_rows(0,'fmbrl',type='csv',debug=False)
+    assert local.refs > 0
+    next(report['lines'],None)
+    report['lines'].close()
+    assert local.refs == 0
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from FMEA_App import FMEA_Function, SqliteBatch
+
+
+def stored(fmea):
+    # the sheet titles committed, read on a connection of its own
+    con = sqlite3.connect(fmea.app.config['db_file'])
+    titles = dict(con.execute('SELECT id, title FROM fmea_function').fetchall())
+    con.close()
+    return titles
+
+
+def sheet(id,title):
+    return FMEA_Function().__nodeinband__({'id':id,'title':title,'parentid':None})
+
+
+def test_batch_commits_once_at_the_end(fmea):
+    cursor = fmea.get_db_connection()
+    with SqliteBatch(cursor):
+        sheet(10,'first').__sqliteupdate__(cursor)
+        sheet(11,'second').__sqliteupdate__(cursor)
+        assert 10 not in stored(fmea)
+    assert stored(fmea)[10] == 'first' and stored(fmea)[11] == 'second'
+    cursor.connection.close()
+
+
+def test_failed_nested_batch_keeps_the_outer_batch(fmea):
+    cursor = fmea.get_db_connection()
+    with SqliteBatch(cursor) as outer:
+        sheet(20,'before').__sqliteupdate__(cursor)
+        nested = SqliteBatch(cursor)
+        with pytest.raises(ValueError):
+            with nested:
+                sheet(21,'nested').__sqliteupdate__(cursor)
+                raise ValueError('nested failure')
+        assert nested.failed
+        # still batched: nothing is committed before the outer batch ends
+        sheet(22,'after').__sqliteupdate__(cursor)
+        assert 22 not in stored(fmea)
+    titles = stored(fmea)
+    assert titles[20] == 'before' and titles[22] == 'after'
+    assert 21 not in titles
+    cursor.connection.close()
+
+
+def test_failed_batch_rolls_back(fmea):
+    cursor = fmea.get_db_connection()
+    batch = SqliteBatch(cursor)
+    with pytest.raises(ValueError):
+        with batch:
+            sheet(30,'dropped').__sqliteupdate__(cursor)
+            raise ValueError('failure')
+    assert batch.failed
+    assert 30 not in stored(fmea)
+    sheet(31,'direct').__sqliteupdate__(cursor)
+    assert stored(fmea)[31] == 'direct'
+    cursor.connection.close()
@@ -0,0 +1,30 @@
+from FMEA_App import FMEA_Function
+
+
+def leaf(id,parentid):
+    return FMEA_Function().__nodeinband__({'id':id,'parentid':parentid,'title':f'leaf {id}'})
+
+
+def ids(tree):
+    return list(l.id for l in tree)
+
+
+def test_sorted_tree_is_reused_while_unchanged():
+    tree = [leaf(0,None),leaf(3,0),leaf(1,0),leaf(2,1)]
+    tree = tree[0].__treesort__(tree)
+    assert ids(tree) == [0,1,2,3]
+    assert tree[0].__treesort__(tree) is tree
+
+
+def test_replaced_leaf_is_sorted_again():
+    tree = [leaf(0,None),leaf(1,0),leaf(2,0)]
+    tree = tree[0].__treesort__(tree)
+    tree[1] = leaf(5,2) # same size, another leaf
+    assert ids(tree[0].__treesort__(tree)) == [0,2,5]
+
+
+def test_moved_leaf_is_sorted_again():
+    tree = [leaf(0,None),leaf(1,0),leaf(2,0),leaf(3,0)]
+    tree = tree[0].__treesort__(tree)
+    tree[1].parentid = 3
+    assert ids(tree[0].__treesort__(tree)) == [0,2,3,1]